@@ -21,6 +21,7 @@ from emoticons import *
 import fl_parser
 import database
 import menu
+import notifier
 from notifier import notify_users, notify_users_task
 
 KEYWORDS_RE = r'^\w{3,16}(,\w{3,16}){0,15}$'
@@ -38,7 +39,7 @@ class Menu(StatesGroup):
     info = State()
 
 database.init()
-fl_parser.init()
+catlists_need_refresh = fl_parser.init()
 
 loop = asyncio.get_event_loop()
 bot = Bot(token=BOT_TOKEN)
@@ -60,7 +61,8 @@ async def show_root(message: Message, user_id: str,
     await message_func(
         text=f'{info_text}{EMO_POINT_RIGHT} Выберите <b>действие</b> '
               'из списка:',
-        reply_markup=menu.get_root(user_id=user_id), parse_mode=ParseMode.HTML)
+        reply_markup=await menu.get_root(user_id=user_id),
+        parse_mode=ParseMode.HTML)
 
 # Переход в меню: root
 @dp.message_handler(Command('start'), state='*')
@@ -78,32 +80,36 @@ async def update(message: Message, state: FSMContext):
 @dp.callback_query_handler(text='enable', state=Menu.root)
 async def menu_enable(call: CallbackQuery, state: FSMContext):
     user_id = call.from_user.id
-    database.save_settings(user_id, active=True)
-    await call.message.edit_reply_markup(reply_markup=menu.get_root(user_id))
+    await database.save_settings_async(user_id, active=True)
+    await call.message.edit_reply_markup(
+        reply_markup=await menu.get_root(user_id))
     await call.answer('Отправка оповещений активирована!')
 
 # Действие: отключить отправку сообщений
 @dp.callback_query_handler(text='disable', state=Menu.root)
 async def menu_disable(call: CallbackQuery, state: FSMContext):
     user_id = call.from_user.id
-    database.save_settings(user_id, active=False)
-    await call.message.edit_reply_markup(reply_markup=menu.get_root(user_id))
+    await database.save_settings_async(user_id, active=False)
+    await call.message.edit_reply_markup(
+        reply_markup=await menu.get_root(user_id))
     await call.answer('Отправка оповещений отключена!')
 
 # Действие: активировать сообщения по e-mail
 @dp.callback_query_handler(text='email_enable', state=Menu.root)
 async def menu_email_enable(call: CallbackQuery, state: FSMContext):
     user_id = call.from_user.id
-    database.save_settings(user_id, email_active=True)
-    await call.message.edit_reply_markup(reply_markup=menu.get_root(user_id))
+    await database.save_settings_async(user_id, email_active=True)
+    await call.message.edit_reply_markup(
+        reply_markup=await menu.get_root(user_id))
     await call.answer('Оповещения по e-mail активированы!')
 
 # Действие: отключить сообщения по e-mail
 @dp.callback_query_handler(text='email_disable', state=Menu.root)
 async def menu_email_disable(call: CallbackQuery, state: FSMContext):
     user_id = call.from_user.id
-    database.save_settings(user_id, email_active=False)
-    await call.message.edit_reply_markup(reply_markup=menu.get_root(user_id))
+    await database.save_settings_async(user_id, email_active=False)
+    await call.message.edit_reply_markup(
+        reply_markup=await menu.get_root(user_id))
     await call.answer('Оповещения по e-mail отключены!')
 
 # Отобразить меню: select_host
@@ -125,7 +131,7 @@ async def menu_select_host(call: CallbackQuery, state: FSMContext):
 async def menu_input_email(call: CallbackQuery, state: FSMContext):
     await call.answer()
 
-    settings = database.get_settings(call.from_user.id) or {}
+    settings = await database.get_settings_async(call.from_user.id) or {}
     if settings.get('email'):
         msg = f'Текущий e-mail: <b>{settings["email"]}</b>.'
     else:
@@ -145,8 +151,8 @@ async def input_email(message: Message, state: FSMContext):
             if entity['type'] == 'email':
                 first = entity['offset']
                 last = entity['offset'] + entity['length']
-                database.save_settings(message.from_user.id,
-                                       email=message.text[first:last])
+                await database.save_settings_async(
+                    message.from_user.id, email=message.text[first:last])
                 await show_root(
                     message, message.from_user.id,
                     info_text=f'{EMO_INFORMATION} <i>E-mail для оповещений '
@@ -176,7 +182,7 @@ async def menu_confirm_delete(call: CallbackQuery, state: FSMContext):
 # Действие: удаление всех фильтров оповещений
 @dp.callback_query_handler(text='clear', state=Menu.confirm_delete)
 async def confirm_delete(call: CallbackQuery, state: FSMContext):
-    database.delete_filters(call.from_user.id)
+    await database.delete_filters_async(call.from_user.id)
     await show_root(call.message, call.from_user.id)
     await call.answer('Фильтры оповещений удалены!')
 
@@ -191,7 +197,7 @@ async def return_from_confirm_delete(call: CallbackQuery, state: FSMContext):
 async def info(call: CallbackQuery, state: FSMContext):
     await call.answer()
 
-    settings = database.get_settings(call.from_user.id) or {}
+    settings = await database.get_settings_async(call.from_user.id) or {}
 
     msg = 'Отправка оповещений через Telegram '
     if settings.get('active'):
@@ -215,8 +221,8 @@ async def info(call: CallbackQuery, state: FSMContext):
         msg += '\n\n\n<b>Настройки фильтров для сайта '
         msg += f'{fl_parser.host_to_hashtag(host)}</b>.'
 
-        job_filters = database.get_filters(user_id=call.from_user.id,
-                                           host=host, query='keywords') or []
+        job_filters = await database.get_filters_async(
+            user_id=call.from_user.id, host=host, query='keywords') or []
         msg += f'\n\n{EMO_KEY} Поиск по ключевым словам:\n'
         if len(job_filters) > 0:
             msg += ('<b>' + ', '.join(job_filters[0]['keywords'].split(','))
@@ -224,8 +230,8 @@ async def info(call: CallbackQuery, state: FSMContext):
         else:
             msg += '<b>не настроен</b>.'
 
-        job_filters = database.get_filters(user_id=call.from_user.id,
-                                           host=host, query='categories') or []
+        job_filters = await database.get_filters_async(
+            user_id=call.from_user.id, host=host, query='categories') or []
         msg += f'\n\n{EMO_CLIPBOARD} Поиск по категориям:\n'
         if len(job_filters) > 0:
             titles = fl_parser.get_all_titles(host)
@@ -255,7 +261,8 @@ async def show_select_filter_type(message: Message, user_id: str, host: str,
     await message_func(
         text=f'{info_text}{EMO_POINT_RIGHT} Укажите <b>тип фильтра</b> '
               'уведомлений для проектов:',
-        reply_markup=menu.get_select_filter_type(user_id=user_id, host=host),
+        reply_markup=await menu.get_select_filter_type(user_id=user_id,
+                                                       host=host),
         parse_mode=ParseMode.HTML)
 
 # Переход в меню: select_filter_type
@@ -290,7 +297,8 @@ async def show_select_category(message: Message, user_id: str, host: str,
     await message_func(
         text=f'{info_text}{EMO_POINT_RIGHT} Выберите <b>категорию</b> '
               'проектов для фильтра уведомлений:',
-        reply_markup=menu.get_select_category(user_id=user_id, host=host),
+        reply_markup=await menu.get_select_category(user_id=user_id,
+                                                    host=host),
         parse_mode=ParseMode.HTML)
 
 # Переход в меню select_category или состояние input_keywords
@@ -304,8 +312,8 @@ async def menu_select_category(call: CallbackQuery, state: FSMContext):
         return
 
     if call.data == 'keywords':
-        job_filters = database.get_filters(user_id=call.from_user.id,
-                                           host=host, query='keywords') or []
+        job_filters = await database.get_filters_async(
+            user_id=call.from_user.id, host=host, query='keywords') or []
         if len(job_filters) > 0:
             msg = ('Текущий список ключевых слов: <b>' +
                    ', '.join(job_filters[0]['keywords'].split(',')) + '</b>.')
@@ -328,16 +336,16 @@ async def input_keywords(message: Message, state: FSMContext):
     if not host:
         return
 
-    job_filters = database.get_filters(user_id=message.from_user.id,
-                                       host=host, query='keywords') or []
+    job_filters = await database.get_filters_async(
+        user_id=message.from_user.id, host=host, query='keywords') or []
     if len(job_filters) > 0:
         last_job_url = job_filters[0]['last_job_url']
     else:
         last_job_url = ''
 
-    database.save_filter(user_id=message.from_user.id, host=host,
-                         keywords=message.text.lower(),
-                         last_job_url=last_job_url)
+    await database.save_filter_async(user_id=message.from_user.id, host=host,
+                                     keywords=message.text.lower(),
+                                     last_job_url=last_job_url)
 
     await show_select_filter_type(
         message, message.from_user.id, host,
@@ -384,7 +392,7 @@ async def show_select_subcategory(
     await message_func(
         text=f'{info_text}{EMO_POINT_RIGHT} Выберите <b>подкатегории</b> '
               'проектов для фильтра уведомлений:',
-        reply_markup=menu.get_select_subcategory(
+        reply_markup=await menu.get_select_subcategory(
             user_id=user_id, host=host, category_id=category_id),
         parse_mode=ParseMode.HTML)
 
@@ -432,9 +440,9 @@ async def add_subcategory(call: CallbackQuery, state: FSMContext):
     if not category_id:
         return
 
-    job_filters = database.get_filters(user_id=call.from_user.id,
-                                       host=host,
-                                       query='categories') or []
+    job_filters = await database.get_filters_async(user_id=call.from_user.id,
+                                                   host=host,
+                                                   query='categories') or []
     if len(job_filters) > 0:
         job_filter = job_filters[0]
     else:
@@ -482,18 +490,19 @@ async def add_subcategory(call: CallbackQuery, state: FSMContext):
                                        job_filter['subcategories']))
 
         if job_filter['categories'] or job_filter['subcategories']:
-            database.save_filter(user_id=call.from_user.id, host=host,
-                                 categories=job_filter['categories'],
-                                 subcategories=job_filter['subcategories'],
-                                 last_job_url=job_filter['last_job_url'])
+            await database.save_filter_async(
+                user_id=call.from_user.id, host=host,
+                categories=job_filter['categories'],
+                subcategories=job_filter['subcategories'],
+                last_job_url=job_filter['last_job_url'])
         else:
-            database.delete_filters(user_id=call.from_user.id, host=host,
-                                    query='categories')
+            await database.delete_filters_async(
+                user_id=call.from_user.id, host=host, query='categories')
 
         await call.message.edit_reply_markup(
-            reply_markup=menu.get_select_subcategory(user_id=call.from_user.id,
-                                                     host=host,
-                                                     category_id=category_id))
+            reply_markup=await menu.get_select_subcategory(
+                user_id=call.from_user.id, host=host,
+                category_id=category_id))
 
 # Возврат из меню: select_subcategory
 @dp.callback_query_handler(text='back', state=Menu.select_subcategory)
@@ -517,6 +526,18 @@ async def error(call: CallbackQuery, state: FSMContext):
     await call.message.answer('Введите команду /start для перезапуска бота.')
     await call.answer('При попытке выполнить операцию произошёл сбой!')
 
+# Освободить сетевые ресурсы при завершении работы
+async def on_shutdown(dp: Dispatcher):
+    if notifier.telegram_queue is not None:
+        await notifier.telegram_queue.stop()
+    if notifier.email_sender is not None:
+        await notifier.email_sender.close()
+    await fl_parser.close_session()
+    await database.close_async()
+
 if __name__ == '__main__':
     loop.create_task(notify_users_task(bot))
-    executor.start_polling(dp, skip_updates=True)
+    loop.create_task(database.maintenance_task())
+    loop.create_task(fl_parser.refresh_catlists_task(
+        refresh_now=catlists_need_refresh))
+    executor.start_polling(dp, skip_updates=True, on_shutdown=on_shutdown)
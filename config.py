@@ -20,6 +20,18 @@ NOTIFY_PERIOD = 60 * 30
 # SHUTDOWN_PERIOD = False
 SHUTDOWN_PERIOD = 60 * 60 * 24
 
+# Период обслуживания базы данных: возврат свободных страниц файловой системе
+# и обновление статистики запросов (в секундах)
+MAINTENANCE_PERIOD = 60 * 60
+
+# Период обновления структуры категорий проектов бирж фриланса (в секундах)
+CATLIST_REFRESH_PERIOD = 60 * 60 * 6
+
+# Начальная пауза перед повторной попыткой построить структуру категорий, если
+# предыдущая попытка не удалась (в секундах). После каждой неудачи пауза
+# удваивается, но не превышает CATLIST_REFRESH_PERIOD
+CATLIST_RETRY_PERIOD = 60
+
 # Номер порта SMTP для STARTTLS службы GMail
 SMTP_PORT = 587
 
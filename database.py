@@ -2,12 +2,21 @@
 хранятся пользовательские настройки и фильтры проектов.
 """
 import logging
+import asyncio
 import os
 import sqlite3
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
 
-from config import DB_NAME
+from config import DB_NAME, MAINTENANCE_PERIOD
 
 SQL_CREATE_DB = """\
+PRAGMA auto_vacuum = INCREMENTAL;
+
 CREATE TABLE IF NOT EXISTS user (
     user_id INTEGER PRIMARY KEY,
     active INTEGER DEFAULT 0,
@@ -22,13 +31,71 @@ CREATE TABLE IF NOT EXISTS job_filter (
     categories TEXT DEFAULT '',
     subcategories TEXT DEFAULT '',
     keywords TEXT DEFAULT '',
-    last_job_url TEXT DEFAULT ''
+    last_job_url TEXT DEFAULT '',
+    seen_jobs TEXT DEFAULT ''
 );
 
 CREATE INDEX IF NOT EXISTS idx_user_id
 ON job_filter (user_id);
+
+CREATE TABLE IF NOT EXISTS subscription (
+    user_id INTEGER NOT NULL,
+    host TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    cat_id TEXT NOT NULL,
+    PRIMARY KEY (user_id, host, kind, cat_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_subscription_cat
+ON subscription (host, kind, cat_id, user_id);
+
+CREATE TABLE IF NOT EXISTS job (
+    id INTEGER PRIMARY KEY,
+    host TEXT NOT NULL,
+    job_key TEXT NOT NULL,
+    title TEXT DEFAULT '',
+    url TEXT DEFAULT '',
+    price TEXT DEFAULT '',
+    description TEXT DEFAULT '',
+    categories TEXT DEFAULT '',
+    first_seen INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL,
+    UNIQUE (host, job_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_last_seen
+ON job (last_seen);
+
+CREATE TABLE IF NOT EXISTS delivery (
+    user_id INTEGER NOT NULL,
+    job_id INTEGER NOT NULL,
+    sent_at INTEGER NOT NULL,
+    PRIMARY KEY (user_id, job_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_delivery_job
+ON delivery (job_id);
+
+CREATE INDEX IF NOT EXISTS idx_delivery_sent_at
+ON delivery (sent_at);
 """
 
+# Версия схемы базы данных (хранится в PRAGMA user_version); см.
+# migrate_database()
+SCHEMA_VERSION = 3
+
+# Доля свободных страниц в файле базы данных, при превышении которой
+# выполняется их возврат файловой системе (см. maintain())
+FREELIST_RATIO = 0.1
+
+# Время хранения проектов и записей об их доставке пользователям (в секундах)
+JOB_TTL = 60 * 60 * 24 * 30
+
+# Тип подписки в таблице subscription: на категорию целиком или на
+# отдельную подкатегорию
+KIND_CATEGORY = 'category'
+KIND_SUBCATEGORY = 'subcategory'
+
 SQL_USER_INSERT = """\
 INSERT INTO user (user_id, active, email, email_active)
 VALUES (:user_id, :active, :email, :email_active);
@@ -66,39 +133,119 @@ VALUES (:user_id, :host, :categories, :subcategories,
 SQL_FILTER_UPDATE_KW = """\
 UPDATE job_filter
 SET keywords = :keywords, categories = '', subcategories = '',
-    last_job_url = :last_job_url
+    last_job_url = :last_job_url,
+    seen_jobs = CASE WHEN keywords = :keywords THEN seen_jobs ELSE '' END
 WHERE user_id = :user_id AND host = :host AND keywords <> '';
 """
 
 SQL_FILTER_UPDATE_CATS = """\
 UPDATE job_filter
 SET categories = :categories, subcategories = :subcategories,
-    last_job_url = :last_job_url
+    last_job_url = :last_job_url,
+    seen_jobs = CASE WHEN categories = :categories
+                          AND subcategories = :subcategories
+                     THEN seen_jobs ELSE '' END
+WHERE user_id = :user_id AND host = :host AND keywords = '';
+"""
+
+SQL_FILTER_UPDATE_LAST_JOB_KW = """\
+UPDATE job_filter
+SET last_job_url = :last_job_url, seen_jobs = :seen_jobs
+WHERE user_id = :user_id AND host = :host AND keywords <> '';
+"""
+
+SQL_FILTER_UPDATE_LAST_JOB_CATS = """\
+UPDATE job_filter
+SET last_job_url = :last_job_url, seen_jobs = :seen_jobs
 WHERE user_id = :user_id AND host = :host AND keywords = '';
 """
 
 SQL_FILTER_SELECT = """\
 SELECT host, categories, subcategories, keywords, last_job_url
 FROM job_filter
-WHERE user_id = :user_id;
+WHERE user_id = :user_id
+ORDER BY id;
+"""
+
+SQL_ACTIVE_USERS_SELECT = """\
+SELECT u.user_id, u.active, u.email, u.email_active,
+       f.host, f.categories, f.subcategories, f.keywords, f.last_job_url,
+       f.seen_jobs
+FROM user AS u
+JOIN job_filter AS f ON f.user_id = u.user_id
+WHERE (u.active <> 0 OR u.email_active <> 0)
+      AND (:user_id IS NULL OR u.user_id = :user_id)
+ORDER BY u.user_id, f.host, f.keywords = '', f.id;
 """
 
-SQL_FILTER_SELECT_HOST = """\
-SELECT categories, subcategories, keywords, last_job_url
+SQL_FILTER_SELECT_ALL_CATS = """\
+SELECT user_id, host, categories, subcategories
 FROM job_filter
+WHERE keywords = '';
+"""
+
+SQL_SUBSCRIPTION_INSERT = """\
+INSERT OR IGNORE INTO subscription (user_id, host, kind, cat_id)
+VALUES (:user_id, :host, :kind, :cat_id);
+"""
+
+SQL_SUBSCRIPTION_DELETE_HOST = """\
+DELETE FROM subscription
 WHERE user_id = :user_id AND host = :host;
 """
 
-SQL_FILTER_SELECT_KW = """\
-SELECT keywords, last_job_url
-FROM job_filter
-WHERE user_id = :user_id AND host = :host AND keywords <> '';
+SQL_SUBSCRIPTION_DELETE = """\
+DELETE FROM subscription
+WHERE user_id = :user_id;
 """
 
-SQL_FILTER_SELECT_CATS = """\
-SELECT categories, subcategories, last_job_url
-FROM job_filter
-WHERE user_id = :user_id AND host = :host AND keywords = '';
+SQL_SUBSCRIPTION_SELECT_USER = """\
+SELECT kind, cat_id
+FROM subscription
+WHERE user_id = :user_id AND host = :host;
+"""
+
+# Выборка подписчиков; {} заменяется списком параметров для оператора IN
+SQL_SUBSCRIBERS_SELECT = """\
+SELECT DISTINCT user_id
+FROM subscription
+WHERE host = ? AND kind = ? AND cat_id IN ({});
+"""
+
+SQL_JOB_UPSERT = """\
+INSERT INTO job (host, job_key, title, url, price, description, categories,
+                 first_seen, last_seen)
+VALUES (:host, :job_key, :title, :url, :price, :description, :categories,
+        :seen, :seen)
+ON CONFLICT (host, job_key) DO UPDATE
+SET title = excluded.title, url = excluded.url, price = excluded.price,
+    description = excluded.description,
+    categories = CASE WHEN excluded.categories <> ''
+                      THEN excluded.categories ELSE job.categories END,
+    last_seen = excluded.last_seen;
+"""
+
+SQL_DELIVERY_INSERT = """\
+INSERT OR IGNORE INTO delivery (user_id, job_id, sent_at)
+SELECT :user_id, id, :sent_at
+FROM job
+WHERE host = :host AND job_key = :job_key;
+"""
+
+SQL_DELIVERY_DELETE = """\
+DELETE FROM delivery
+WHERE user_id = :user_id;
+"""
+
+SQL_DELIVERY_PRUNE = """\
+DELETE FROM delivery
+WHERE sent_at < :expired;
+"""
+
+SQL_JOB_PRUNE = """\
+DELETE FROM job
+WHERE last_seen < :expired
+      AND NOT EXISTS (SELECT 1 FROM delivery WHERE job_id = job.id);
 """
 
 SQL_FILTER_DELETE_KW = """\
@@ -116,6 +263,135 @@ DELETE FROM job_filter
 WHERE user_id = :user_id;
 """
 
+# Число строк, считываемых из базы за один раз при потоковом чтении
+FETCH_BATCH_SIZE = 500
+
+# Максимальное число идентификаторов в одном sql-запросе с оператором IN
+# (ограничение SQLite на число параметров запроса - 999)
+MAX_QUERY_IDS = 900
+
+# Компактные записи для массовой загрузки пользователей и фильтров (см.
+# iter_active_users()). Смысловые значения полей - см. save_settings() и
+# save_filter(); categories и subcategories - кортежи строковых
+# идентификаторов, seen_jobs - см. save_checkpoints()
+UserRecord = namedtuple('UserRecord',
+                        'user_id active email email_active filters')
+FilterRecord = namedtuple(
+    'FilterRecord',
+    'host categories subcategories keywords last_job_url seen_jobs')
+
+# Максимальное число пользователей, чьи настройки и фильтры хранятся в кеше
+USER_CACHE_SIZE = 1000
+
+"""Кеш настроек и фильтров пользователей для быстрой отрисовки меню. Ключ -
+строковый идентификатор пользователя, значение - dict('settings': dict,
+'filters': list) в формате get_settings() и get_filters() (None - ещё не
+прочитано из базы). Кеш обновляется при каждой записи в базу (write-through),
+давно не использованные записи вытесняются.
+"""
+_user_cache = OrderedDict()
+_user_cache_lock = threading.Lock()
+
+# Параметры, устанавливаемые для каждого нового соединения с базой данных:
+# инкрементальная дефрагментация (действует только для новой, ещё пустой
+# базы), журнал с упреждающей записью (WAL), ослабленная синхронизация
+# (безопасна в режиме WAL), кеш страниц 8 МБ, отображение файла в память до
+# 64 МБ и ожидание снятия блокировки до 5 секунд
+SQL_PRAGMAS = """\
+PRAGMA auto_vacuum = INCREMENTAL;
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+PRAGMA cache_size = -8000;
+PRAGMA mmap_size = 67108864;
+PRAGMA busy_timeout = 5000;
+"""
+
+# Число подготовленных sql-запросов, кешируемых каждым соединением
+STATEMENT_CACHE_SIZE = 64
+
+"""Соединения с базой данных открываются однократно для каждого потока и
+используются повторно всеми функциями модуля.
+"""
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+
+# Получить соединение с базой данных для текущего потока
+def get_connection() -> sqlite3.Connection:
+    con = getattr(_local, 'connection', None)
+
+    if con is None:
+        con = sqlite3.connect(DB_NAME, cached_statements=STATEMENT_CACHE_SIZE)
+        con.executescript(SQL_PRAGMAS)
+        _local.connection = con
+        with _connections_lock:
+            _connections.append(con)
+
+    return con
+
+"""Все обращения к базе данных из асинхронного кода (функции с суффиксом
+_async) выполняются в одном выделенном потоке, чтобы не блокировать цикл
+событий; при этом поток использует одно постоянное соединение.
+"""
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='database')
+
+# Выполнить функцию модуля в потоке базы данных, не блокируя цикл событий
+async def _run_async(func, *args, **kwargs):
+    return await asyncio.get_event_loop().run_in_executor(
+        _executor, partial(func, *args, **kwargs))
+
+# Закрыть все открытые соединения с базой данных
+def close_connections():
+    with _connections_lock:
+        for con in _connections:
+            try:
+                con.close()
+            except sqlite3.ProgrammingError:
+                # Соединение другого потока закроется при его завершении
+                pass
+        _connections.clear()
+
+    _local.__dict__.clear()
+
+# Получить запись кеша для пользователя (создаётся при отсутствии); вызывается
+# при захваченной блокировке _user_cache_lock
+def _get_cache_entry(user_id: str) -> dict:
+    entry = _user_cache.get(user_id)
+
+    if entry is None:
+        entry = {'settings': None, 'filters': None}
+        _user_cache[user_id] = entry
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+    else:
+        _user_cache.move_to_end(user_id)
+
+    return entry
+
+# Очистить кеш настроек и фильтров (для всех пользователей или одного)
+def clear_cache(user_id: str=None):
+    with _user_cache_lock:
+        if user_id is None:
+            _user_cache.clear()
+        else:
+            _user_cache.pop(str(user_id), None)
+
+# Проверить, соответствует ли фильтр заданному сайту и типу фильтра
+def _match_filter(job_filter: dict, host: str, query=None) -> bool:
+    if host and job_filter['host'] != host:
+        return False
+    if query == 'keywords':
+        return bool(job_filter['keywords'])
+    if query == 'categories':
+        return not job_filter['keywords']
+    return True
+
+# Копия фильтра, которую вызывающий код может изменять, не затрагивая кеш
+def _copy_filter(job_filter: dict) -> dict:
+    return dict(job_filter,
+                categories=list(job_filter['categories']),
+                subcategories=list(job_filter['subcategories']))
+
 # Специальная функция для формирования словаря вместо списка в sql-запросах
 def dict_factory(cursor, row):
     d = {}
@@ -125,7 +401,7 @@ def dict_factory(cursor, row):
 
 # Создание базы данных (если не существует)
 def create_database() -> bool:
-    con = sqlite3.connect(DB_NAME)
+    con = get_connection()
     cur = con.cursor()
 
     try:
@@ -138,12 +414,84 @@ def create_database() -> bool:
         result = True
 
     cur.close()
-    con.close()
+    return result
+
+# Получить параметры записей таблицы subscription для фильтра по категориям
+def _get_subscription_params(user_id: str, host: str, categories,
+                             subcategories) -> list:
+    return ([{'user_id': int(user_id), 'host': host,
+              'kind': KIND_CATEGORY, 'cat_id': category_id}
+             for category_id in categories]
+            + [{'user_id': int(user_id), 'host': host,
+                'kind': KIND_SUBCATEGORY, 'cat_id': subcategory_id}
+               for subcategory_id in subcategories])
+
+# Обновление схемы базы данных до текущей версии SCHEMA_VERSION
+def migrate_database() -> bool:
+    """Версия 1: подписки на категории и подкатегории, хранящиеся в
+    job_filter в виде строк через запятую, переносятся в таблицу subscription.
+
+    Версия 2: включается инкрементальная дефрагментация (auto_vacuum =
+    INCREMENTAL); для базы, созданной ранее, это требует однократной полной
+    дефрагментации.
+
+    Версия 3: в таблицу job_filter добавляется столбец seen_jobs.
+    """
+    con = get_connection()
+    cur = con.cursor()
+
+    try:
+        version = cur.execute('PRAGMA user_version;').fetchone()[0]
+
+        if version < 1:
+            params = []
+            for row in cur.execute(SQL_FILTER_SELECT_ALL_CATS).fetchall():
+                params.extend(_get_subscription_params(
+                    row[0], row[1],
+                    row[2].split(',') if row[2] else [],
+                    row[3].split(',') if row[3] else []))
+
+            with con:
+                cur.executemany(SQL_SUBSCRIPTION_INSERT, params)
+                cur.execute('PRAGMA user_version = 1;')
+
+            logging.info(f'Перенесено подписок на категории: {len(params)}.')
+
+        if version < 2:
+            # Режим auto_vacuum 2 - INCREMENTAL
+            if cur.execute('PRAGMA auto_vacuum;').fetchone()[0] != 2:
+                cur.executescript('PRAGMA auto_vacuum = INCREMENTAL; VACUUM;')
+                logging.info('Включена инкрементальная дефрагментация БД.')
+
+            with con:
+                cur.execute('PRAGMA user_version = 2;')
+
+        if version < 3:
+            columns = [row[1] for row
+                       in cur.execute('PRAGMA table_info(job_filter);')]
+            with con:
+                if 'seen_jobs' not in columns:
+                    cur.execute('ALTER TABLE job_filter '
+                                "ADD COLUMN seen_jobs TEXT DEFAULT '';")
+                cur.execute('PRAGMA user_version = 3;')
+    except sqlite3.DatabaseError:
+        logging.error('Не удалось обновить схему базы данных.')
+        result = False
+    else:
+        result = True
+
+    cur.close()
     return result
 
 # Удаление базы данных
 def remove_database() -> bool:
+    close_connections()
+    clear_cache()
+
     try:
+        for suffix in ['-wal', '-shm']:
+            if os.path.exists(DB_NAME + suffix):
+                os.remove(DB_NAME + suffix)
         os.remove(DB_NAME)
     except OSError:
         logging.error('Не удалось удалить базу данных.')
@@ -184,7 +532,7 @@ def save_settings(user_id: str, active=None,
     else:
         params['email_active'] = int(email_active)
 
-    con = sqlite3.connect(DB_NAME)
+    con = get_connection()
     cur = con.cursor()
 
     try:
@@ -192,12 +540,19 @@ def save_settings(user_id: str, active=None,
             cur.execute(sql, params)
     except sqlite3.DatabaseError:
         logging.error('Не удалось сохранить настройки пользователя.')
+        clear_cache(user_id)
         result = False
     else:
+        with _user_cache_lock:
+            _get_cache_entry(str(user_id))['settings'] = {
+                'user_id': str(user_id),
+                'active': bool(params['active']),
+                'email': params['email'],
+                'email_active': bool(params['email_active']),
+            }
         result = True
 
     cur.close()
-    con.close()
     return result
 
 # Прочитать из базы настройки всех пользователей
@@ -213,7 +568,7 @@ def get_settings_all() -> []:
 
     Смысловые значения ключей - см. save_settings()
     """
-    con = sqlite3.connect(DB_NAME)
+    con = get_connection()
     cur = con.cursor()
 
     try:
@@ -233,9 +588,60 @@ def get_settings_all() -> []:
             })
 
     cur.close()
-    con.close()
     return result
 
+# Последовательно прочитать из базы всех пользователей с включёнными
+# уведомлениями вместе с их фильтрами проектов (одним запросом)
+def iter_active_users(user_id: str=None):
+    """Входной параметр:
+    user_id: str - строковый идентификатор пользователя Telegram; если задан,
+    то читается только этот пользователь.
+
+    Генератор записей UserRecord; поле filters содержит список записей
+    FilterRecord, упорядоченный по сайтам, а для каждого сайта - сначала фильтр
+    по ключевым словам, затем по категориям. Пользователи без фильтров не
+    возвращаются. Строки читаются порциями по FETCH_BATCH_SIZE, поэтому расход
+    памяти не зависит от числа пользователей.
+    """
+    params = {'user_id': int(user_id) if user_id else None}
+
+    con = get_connection()
+    cur = con.cursor()
+
+    try:
+        cur.execute(SQL_ACTIVE_USERS_SELECT, params)
+
+        user = None
+        while True:
+            rows = cur.fetchmany(FETCH_BATCH_SIZE)
+            if not rows:
+                break
+
+            for row in rows:
+                if user is None or user.user_id != str(row[0]):
+                    if user is not None:
+                        yield user
+                    user = UserRecord(user_id=str(row[0]),
+                                      active=bool(row[1]),
+                                      email=row[2],
+                                      email_active=bool(row[3]),
+                                      filters=[])
+
+                user.filters.append(FilterRecord(
+                    host=row[4],
+                    categories=tuple(row[5].split(',')) if row[5] else (),
+                    subcategories=tuple(row[6].split(',')) if row[6] else (),
+                    keywords=row[7],
+                    last_job_url=row[8],
+                    seen_jobs=_decode_seen_jobs(row[9])))
+
+        if user is not None:
+            yield user
+    except sqlite3.DatabaseError:
+        logging.error('Не удалось прочитать данные о пользователях.')
+    finally:
+        cur.close()
+
 # Получить настройки заданного пользователя
 def get_settings(user_id: str) -> dict:
     """Входной параметр:
@@ -249,7 +655,12 @@ def get_settings(user_id: str) -> dict:
 
     Смысловые значения ключей - см. save_settings().
     """
-    con = sqlite3.connect(DB_NAME)
+    with _user_cache_lock:
+        settings = _get_cache_entry(str(user_id))['settings']
+        if settings is not None:
+            return dict(settings)
+
+    con = get_connection()
     cur = con.cursor()
 
     try:
@@ -261,7 +672,7 @@ def get_settings(user_id: str) -> dict:
     else:
         if row:
             result = {
-                'user_id': user_id,
+                'user_id': str(user_id),
                 'active': bool(row[0]),
                 'email': row[1],
                 'email_active': bool(row[2]),
@@ -269,8 +680,10 @@ def get_settings(user_id: str) -> dict:
         else:
             result = {}
 
+        with _user_cache_lock:
+            _get_cache_entry(str(user_id))['settings'] = dict(result)
+
     cur.close()
-    con.close()
     return result
 
 # Сохранить фильтр проектов для уведомлений
@@ -290,6 +703,10 @@ def save_filter(user_id: str, host: str, categories=[], subcategories=[],
     игнорируются, поскольку будет сохранён фильтр по ключевым словам. Иначе
     сохраняется фильтр по категориям (где нет ключевых слов).
 
+    При изменении ключевых слов или категорий сохранённого фильтра множество
+    его просмотренных проектов (см. save_checkpoints()) очищается, так как оно
+    относится к ленте проектов прежнего фильтра.
+
     Замечание: для каждой категории из списка categories подразумевается, что
     все её подкатегории тоже выбраны. Поэтому не следует указывать дочерние
     подкатегории в списке subcategories.
@@ -322,20 +739,204 @@ def save_filter(user_id: str, host: str, categories=[], subcategories=[],
     else:
         sql = SQL_FILTER_INSERT
 
-    con = sqlite3.connect(DB_NAME)
+    con = get_connection()
     cur = con.cursor()
 
     try:
         with con:
             cur.execute(sql, params)
+            if not keywords:
+                cur.execute(SQL_SUBSCRIPTION_DELETE_HOST, params)
+                cur.executemany(SQL_SUBSCRIPTION_INSERT,
+                                _get_subscription_params(
+                                    user_id, host, categories, subcategories))
     except sqlite3.DatabaseError:
         logging.error('Не удалось сохранить фильтр для уведомлений.')
+        clear_cache(user_id)
+        result = False
+    else:
+        saved_filter = {
+            'user_id': str(user_id),
+            'host': host,
+            'categories': (params['categories'].split(',')
+                           if params['categories'] else []),
+            'subcategories': (params['subcategories'].split(',')
+                              if params['subcategories'] else []),
+            'keywords': keywords,
+            'last_job_url': last_job_url,
+        }
+
+        with _user_cache_lock:
+            cached_filters = _get_cache_entry(str(user_id))['filters']
+            if cached_filters is not None:
+                if sql == SQL_FILTER_INSERT:
+                    cached_filters.append(saved_filter)
+                else:
+                    for index, job_filter in enumerate(cached_filters):
+                        if _match_filter(job_filter, host, query):
+                            cached_filters[index] = _copy_filter(saved_filter)
+        result = True
+
+    cur.close()
+    return result
+
+# Преобразовать множество просмотренных проектов фильтра в строку для
+# хранения в базе: пары "ключ проекта:время" через пробел
+def _encode_seen_jobs(seen_jobs: dict) -> str:
+    return ' '.join(f'{job_key}:{int(seen_time)}'
+                    for job_key, seen_time in seen_jobs.items())
+
+# Обратное преобразование для _encode_seen_jobs()
+def _decode_seen_jobs(text: str) -> dict:
+    seen_jobs = {}
+    for item in (text or '').split():
+        job_key, _, seen_time = item.rpartition(':')
+        if job_key and seen_time.isdigit():
+            seen_jobs[job_key] = int(seen_time)
+    return seen_jobs
+
+# Сохранить одной транзакцией адреса последних проектов в уведомлениях и
+# множества просмотренных проектов для многих фильтров сразу (контрольные
+# точки цикла рассылки)
+def save_checkpoints(checkpoints: list) -> bool:
+    """Входной параметр:
+    checkpoints: list - список контрольных точек вида
+    [
+        dict('user_id': str,
+             'host': str,
+             'query': str - тип фильтра: 'keywords' или 'categories',
+             'last_job_url': str,
+             'seen_jobs': dict - просмотренные проекты фильтра: ключ проекта
+             (см. fl_parser.get_job_key()) -> время, когда проект последний
+             раз был в ленте (секунды от начала эпохи)),
+        ... ... ...
+    ]
+
+    Смысловые значения ключей - см. save_filter() и get_filters(). Изменяются
+    только last_job_url и seen_jobs: содержимое фильтров, отредактированных
+    пользователем во время цикла рассылки, сохраняется.
+    """
+    params_kw = []
+    params_cats = []
+    for checkpoint in checkpoints:
+        params = {
+            'user_id': int(checkpoint['user_id']),
+            'host': checkpoint['host'],
+            'last_job_url': checkpoint['last_job_url'],
+            'seen_jobs': _encode_seen_jobs(checkpoint.get('seen_jobs', {})),
+        }
+        if checkpoint['query'] == 'keywords':
+            params_kw.append(params)
+        else:
+            params_cats.append(params)
+
+    con = get_connection()
+    cur = con.cursor()
+
+    try:
+        with con:
+            cur.executemany(SQL_FILTER_UPDATE_LAST_JOB_KW, params_kw)
+            cur.executemany(SQL_FILTER_UPDATE_LAST_JOB_CATS, params_cats)
+    except sqlite3.DatabaseError:
+        logging.error('Не удалось сохранить контрольные точки рассылки.')
+        result = False
+    else:
+        with _user_cache_lock:
+            for checkpoint in checkpoints:
+                entry = _user_cache.get(str(checkpoint['user_id']))
+                if entry is None or entry['filters'] is None:
+                    continue
+                for job_filter in entry['filters']:
+                    if _match_filter(job_filter, checkpoint['host'],
+                                     checkpoint['query']):
+                        job_filter['last_job_url'] = checkpoint['last_job_url']
+        result = True
+
+    cur.close()
+    return result
+
+# Сохранить (добавить или обновить) проекты, полученные за цикл рассылки,
+# одной транзакцией
+def save_jobs(jobs: list) -> bool:
+    """Входной параметр:
+    jobs: list - список проектов вида
+    [
+        dict('host': str - адрес сайта биржи фриланса;
+             'job_key': str - ключ проекта (см. fl_parser.get_job_key());
+             'title', 'url', 'price', 'description': str - см.
+             fl_parser.get_jobs_fl_ru();
+             'categories': list - строковые идентификаторы лент (категорий
+             или подкатегорий), в которых встретился проект; может
+             отсутствовать),
+        ... ... ...
+    ]
+
+    Каждый проект хранится в единственном экземпляре (ключ - сайт и ключ
+    проекта); для уже известного проекта обновляются его данные и время
+    последней встречи в ленте.
+    """
+    now = int(time.time())
+    params = [{
+        'host': job['host'],
+        'job_key': job['job_key'],
+        'title': job.get('title', ''),
+        'url': job.get('url', ''),
+        'price': job.get('price', ''),
+        'description': job.get('description', ''),
+        'categories': ','.join(job.get('categories', [])),
+        'seen': now,
+    } for job in jobs]
+
+    con = get_connection()
+    cur = con.cursor()
+
+    try:
+        with con:
+            cur.executemany(SQL_JOB_UPSERT, params)
+    except sqlite3.DatabaseError:
+        logging.error('Не удалось сохранить проекты.')
+        result = False
+    else:
+        result = True
+
+    cur.close()
+    return result
+
+# Сохранить одной транзакцией записи о доставке проектов пользователям
+def save_deliveries(deliveries: list) -> bool:
+    """Входной параметр:
+    deliveries: list - список записей вида
+    [
+        dict('user_id': str,
+             'host': str,
+             'job_key': str),
+        ... ... ...
+    ]
+
+    Записи ссылаются на проекты, ранее сохранённые save_jobs(); записи о
+    неизвестных проектах и повторные записи игнорируются.
+    """
+    now = int(time.time())
+    params = [{
+        'user_id': int(delivery['user_id']),
+        'host': delivery['host'],
+        'job_key': delivery['job_key'],
+        'sent_at': now,
+    } for delivery in deliveries]
+
+    con = get_connection()
+    cur = con.cursor()
+
+    try:
+        with con:
+            cur.executemany(SQL_DELIVERY_INSERT, params)
+    except sqlite3.DatabaseError:
+        logging.error('Не удалось сохранить записи о доставке проектов.')
         result = False
     else:
         result = True
 
     cur.close()
-    con.close()
     return result
 
 # Прочитать из базы фильтры проектов для уведомлений
@@ -358,57 +959,124 @@ def get_filters(user_id: str, host='', query=None) -> []:
     ]
 
     Смысловые значения ключей - см. save_filter().
-    """
-    params = {
-        'user_id': int(user_id),
-        'host': host,
-    }
 
-    if host:
-        if query == 'keywords':
-            sql = SQL_FILTER_SELECT_KW
-        elif query == 'categories':
-            sql = SQL_FILTER_SELECT_CATS
-        else:
-            sql = SQL_FILTER_SELECT_HOST
-    else:
-        sql = SQL_FILTER_SELECT
+    Все фильтры пользователя читаются из базы однократно и далее берутся из
+    кеша.
+    """
+    with _user_cache_lock:
+        cached_filters = _get_cache_entry(str(user_id))['filters']
+        if cached_filters is not None:
+            return [_copy_filter(job_filter) for job_filter in cached_filters
+                    if _match_filter(job_filter, host, query)]
 
-    con = sqlite3.connect(DB_NAME)
-    con.row_factory = dict_factory
+    con = get_connection()
     cur = con.cursor()
+    cur.row_factory = dict_factory
 
     try:
-        cur.execute(sql, params)
+        cur.execute(SQL_FILTER_SELECT, {'user_id': int(user_id)})
         rows = cur.fetchall()
     except sqlite3.DatabaseError:
         logging.error('Не удалось прочитать фильтр для уведомлений.')
-        result = False
-    else:
-        result = []
-        for row in rows:
-            job_filter = {
-                'user_id': user_id,
-                'host': row.get('host', host),
-                'categories': [],
-                'subcategories': [],
-                'last_job_url': row.get('last_job_url', ''),
-            }
+        cur.close()
+        return False
+
+    cur.close()
+
+    all_filters = []
+    for row in rows:
+        job_filter = {
+            'user_id': str(user_id),
+            'host': row['host'],
+            'categories': [],
+            'subcategories': [],
+            'last_job_url': row['last_job_url'],
+        }
+
+        job_filter['keywords'] = row['keywords']
+
+        categories = row['categories']
+        if categories:
+            job_filter['categories'] = categories.split(',')
+
+        subcategories = row['subcategories']
+        if subcategories:
+            job_filter['subcategories'] = subcategories.split(',')
+
+        all_filters.append(job_filter)
+
+    with _user_cache_lock:
+        _get_cache_entry(str(user_id))['filters'] = all_filters
+
+    return [_copy_filter(job_filter) for job_filter in all_filters
+            if _match_filter(job_filter, host, query)]
+
+# Получить подписки пользователя на категории и подкатегории заданного сайта
+def get_subscriptions(user_id: str, host: str) -> tuple:
+    """Входные параметры:
+    user_id: str - строковый идентификатор пользователя Telegram;
+    host: str - адрес сайта биржи фриланса.
 
-            job_filter['keywords'] = row.get('keywords', '')
+    Возвращаемое значение:
+    (categories: set, subcategories: set) - множества строковых
+    идентификаторов категорий и подкатегорий.
+    """
+    con = get_connection()
+    cur = con.cursor()
 
-            categories = row.get('categories')
-            if categories:
-                job_filter['categories'] = categories.split(',')
+    try:
+        cur.execute(SQL_SUBSCRIPTION_SELECT_USER,
+                    {'user_id': int(user_id), 'host': host})
+        rows = cur.fetchall()
+    except sqlite3.DatabaseError:
+        logging.error('Не удалось прочитать подписки пользователя.')
+        rows = []
 
-            subcategories = row.get('subcategories')
-            if subcategories:
-                job_filter['subcategories'] = subcategories.split(',')
+    cur.close()
 
-            result.append(job_filter)
+    categories = set()
+    subcategories = set()
+    for kind, cat_id in rows:
+        if kind == KIND_CATEGORY:
+            categories.add(cat_id)
+        else:
+            subcategories.add(cat_id)
+
+    return (categories, subcategories)
+
+# Получить пользователей, подписанных на любую из заданных категорий или
+# подкатегорий сайта (по индексу, без перебора всех пользователей)
+def get_subscribers(host: str, category_ids=(), subcategory_ids=()) -> set:
+    """Входные параметры:
+    host: str - адрес сайта биржи фриланса;
+    category_ids - строковые идентификаторы категорий: учитываются подписки
+    на категорию целиком;
+    subcategory_ids - строковые идентификаторы подкатегорий: учитываются
+    подписки на отдельные подкатегории.
+
+    Возвращаемое значение:
+    множество строковых идентификаторов пользователей Telegram.
+
+    Замечание: подписка на категорию включает все её подкатегории, поэтому
+    для поиска подписчиков подкатегории следует передать и идентификатор
+    родительской категории в category_ids.
+    """
+    con = get_connection()
+    cur = con.cursor()
+
+    result = set()
+    try:
+        for kind, cat_ids in [(KIND_CATEGORY, list(category_ids)),
+                              (KIND_SUBCATEGORY, list(subcategory_ids))]:
+            for start in range(0, len(cat_ids), MAX_QUERY_IDS):
+                chunk = cat_ids[start:start + MAX_QUERY_IDS]
+                sql = SQL_SUBSCRIBERS_SELECT.format(','.join('?' * len(chunk)))
+                cur.execute(sql, [host, kind] + chunk)
+                result.update(str(row[0]) for row in cur.fetchall())
+    except sqlite3.DatabaseError:
+        logging.error('Не удалось прочитать подписчиков категорий.')
 
     cur.close()
-    con.close()
     return result
 
 # Удалить фильтры проектов для уведомлений
@@ -434,20 +1102,32 @@ def delete_filters(user_id: str, host=None, query=None) -> bool:
         elif query == 'categories':
             sql = SQL_FILTER_DELETE_CATS
 
-    con = sqlite3.connect(DB_NAME)
+    con = get_connection()
     cur = con.cursor()
 
     try:
         with con:
             cur.execute(sql, params)
+            if not host:
+                cur.execute(SQL_SUBSCRIPTION_DELETE, params)
+            elif query != 'keywords':
+                cur.execute(SQL_SUBSCRIPTION_DELETE_HOST, params)
     except sqlite3.DatabaseError:
         logging.error('Не удалось удалить фильтры уведомлений.')
+        clear_cache(user_id)
         result = False
     else:
+        with _user_cache_lock:
+            entry = _get_cache_entry(str(user_id))
+            if not host:
+                entry['filters'] = []
+            elif entry['filters'] is not None:
+                entry['filters'] = [
+                    job_filter for job_filter in entry['filters']
+                    if not _match_filter(job_filter, host, query)]
         result = True
 
     cur.close()
-    con.close()
     return result
 
 # Удалить настройки и все фильтры уведомлений для заданного пользователя
@@ -455,45 +1135,143 @@ def delete_settings(user_id: str) -> bool:
     """Входной параметр:
     user_id: str - строковый идентификатор пользователя Telegram.
     """
-    con = sqlite3.connect(DB_NAME)
+    con = get_connection()
     cur = con.cursor()
 
     try:
         with con:
             cur.execute(SQL_FILTER_DELETE, {'user_id': int(user_id)})
+            cur.execute(SQL_SUBSCRIPTION_DELETE, {'user_id': int(user_id)})
+            cur.execute(SQL_DELIVERY_DELETE, {'user_id': int(user_id)})
             cur.execute(SQL_USER_DELETE, {'user_id': int(user_id)})
     except sqlite3.DatabaseError:
         logging.error('Не удалось удалить настройки пользователя.')
+        clear_cache(user_id)
         result = False
     else:
+        with _user_cache_lock:
+            entry = _get_cache_entry(str(user_id))
+            entry['settings'] = {}
+            entry['filters'] = []
         result = True
 
     cur.close()
-    con.close()
     return result
 
-# Произвести дефрагментацию базы данных
-def vacuum() -> bool:
-    con = sqlite3.connect(DB_NAME)
+# Произвести обслуживание базы данных: удалить проекты и записи о доставке
+# старше JOB_TTL, вернуть файловой системе свободные страницы, если их доля
+# превышает FREELIST_RATIO, и обновить статистику для планировщика запросов.
+# В отличие от полного VACUUM, не перезаписывает весь файл, поэтому время
+# выполнения не зависит от размера базы
+def maintain() -> bool:
+    con = get_connection()
     cur = con.cursor()
 
     try:
+        expired = {'expired': int(time.time()) - JOB_TTL}
         with con:
-            cur.executescript('VACUUM;')
+            cur.execute(SQL_DELIVERY_PRUNE, expired)
+            cur.execute(SQL_JOB_PRUNE, expired)
+
+        page_count = cur.execute('PRAGMA page_count;').fetchone()[0]
+        freelist_count = cur.execute('PRAGMA freelist_count;').fetchone()[0]
+
+        if page_count and freelist_count / page_count > FREELIST_RATIO:
+            cur.executescript('PRAGMA incremental_vacuum;')
+            logging.info(f'Освобождено страниц БД: {freelist_count} '
+                         f'из {page_count}.')
+
+        cur.execute('PRAGMA optimize;').fetchall()
     except sqlite3.DatabaseError:
-        logging.error('Не удалось произвести дефрагментацию базы данных.')
+        logging.error('Не удалось выполнить обслуживание базы данных.')
         result = False
     else:
         result = True
 
     cur.close()
-    con.close()
     return result
 
-# Создание базы данных (при необходимости) и её дефрагментация
+# Создание базы данных (при необходимости) и обновление её схемы
 def init():
     if create_database():
         logging.info('БД успешно создана или уже существует.')
 
-    if vacuum():
-        logging.info('Дефрагментация БД выполнена.')
+    if migrate_database():
+        logging.info(f'Схема БД соответствует версии {SCHEMA_VERSION}.')
+
+# Периодическое обслуживание базы данных (см. maintain()) в фоновом режиме
+async def maintenance_task():
+    while True:
+        await asyncio.sleep(MAINTENANCE_PERIOD)
+        await maintain_async()
+
+# Асинхронные версии функций модуля (параметры и результат - см. одноимённые
+# функции без суффикса _async)
+async def iter_active_users_async(user_id: str=None):
+    """Асинхронный генератор записей UserRecord (см. iter_active_users()).
+    Записи читаются в потоке базы данных порциями по FETCH_BATCH_SIZE
+    пользователей, и следующая порция читается только после обработки
+    предыдущей, поэтому в памяти одновременно находится не больше одной
+    порции.
+    """
+    users = iter_active_users(user_id)
+    try:
+        while True:
+            batch = await _run_async(
+                lambda: list(islice(users, FETCH_BATCH_SIZE)))
+            if not batch:
+                break
+            for user in batch:
+                yield user
+    finally:
+        # Генератор закрывается в том же потоке, где открыт его курсор
+        await _run_async(users.close)
+
+async def get_settings_async(user_id: str) -> dict:
+    return await _run_async(get_settings, user_id)
+
+async def save_settings_async(user_id: str, active=None, email=None,
+                              email_active=None) -> bool:
+    return await _run_async(save_settings, user_id, active=active,
+                            email=email, email_active=email_active)
+
+async def delete_settings_async(user_id: str) -> bool:
+    return await _run_async(delete_settings, user_id)
+
+async def get_filters_async(user_id: str, host='', query=None) -> []:
+    return await _run_async(get_filters, user_id, host=host, query=query)
+
+async def save_filter_async(user_id: str, host: str, categories=[],
+                            subcategories=[], keywords='',
+                            last_job_url='') -> bool:
+    return await _run_async(save_filter, user_id, host,
+                            categories=categories, subcategories=subcategories,
+                            keywords=keywords, last_job_url=last_job_url)
+
+async def delete_filters_async(user_id: str, host=None, query=None) -> bool:
+    return await _run_async(delete_filters, user_id, host=host, query=query)
+
+async def maintain_async() -> bool:
+    return await _run_async(maintain)
+
+async def save_jobs_async(jobs: list) -> bool:
+    return await _run_async(save_jobs, jobs)
+
+async def save_deliveries_async(deliveries: list) -> bool:
+    return await _run_async(save_deliveries, deliveries)
+
+async def save_checkpoints_async(checkpoints: list) -> bool:
+    return await _run_async(save_checkpoints, checkpoints)
+
+async def get_subscriptions_async(user_id: str, host: str) -> tuple:
+    return await _run_async(get_subscriptions, user_id, host)
+
+async def get_subscribers_async(host: str, category_ids=(),
+                                subcategory_ids=()) -> set:
+    return await _run_async(get_subscribers, host, category_ids,
+                            subcategory_ids)
+
+# Закрыть соединение потока базы данных и остановить этот поток
+async def close_async():
+    await _run_async(close_connections)
+    _executor.shutdown(wait=False)
@@ -0,0 +1,408 @@
+"""Модуль доставки уведомлений пользователям.
+
+Очередь исходящих сообщений Telegram соблюдает ограничения Telegram на частоту
+отправки сообщений (общую и для каждого чата), выдерживает паузу при ошибке
+RetryAfter, повторяет отправку при временных сбоях и накапливает статистику.
+
+Отправитель e-mail поддерживает постоянное авторизованное SMTP-соединение и
+работает в отдельном потоке, не блокируя цикл событий.
+"""
+import logging
+import asyncio
+import time
+import smtplib
+import ssl
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from aiogram import Bot
+from aiogram.utils.exceptions import (RetryAfter, NetworkError,
+                                      RestartingTelegram)
+
+from throttling import TokenBucket
+
+# Максимальная общая частота отправки сообщений (сообщений в секунду)
+MESSAGE_RATE = 25
+
+# Минимальный интервал между сообщениями в один чат (секунды)
+CHAT_INTERVAL = 1
+
+# Число повторных попыток отправки при временных сбоях и начальная задержка
+# перед повтором (секунды); каждая следующая задержка вдвое больше
+MAX_RETRIES = 5
+RETRY_DELAY = 2
+
+# Размер таблицы времени последней отправки по чатам, при превышении которого
+# устаревшие записи удаляются
+CHAT_TABLE_SIZE = 10000
+
+# Время ожидания ответа от SMTP-сервера (секунды)
+SMTP_TIMEOUT = 30
+
+# Максимальное число писем за одно SMTP-соединение, после которого
+# соединение переустанавливается
+SMTP_SESSION_MESSAGES = 100
+
+class TelegramQueue:
+    """Очередь исходящих сообщений Telegram.
+
+    bot: Bot - экземпляр бота;
+    rate: float - максимальная общая частота отправки (сообщений в секунду);
+    chat_interval: float - минимальный интервал между сообщениями в один чат
+    (секунды);
+    max_retries: int - число повторных попыток при временных сбоях.
+    """
+    def __init__(self, bot: Bot, rate: float=MESSAGE_RATE,
+                 chat_interval: float=CHAT_INTERVAL,
+                 max_retries: int=MAX_RETRIES):
+        self.bot = bot
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+
+        self._limiter = TokenBucket(rate=rate, burst=max(1, int(rate)))
+        self._queue = None
+        self._worker = None
+        self._chat_next = {}
+        self._chat_pending = {}
+        self._chat_release = {}
+        self._paused_until = 0.0
+        self._delayed = 0
+        self._sending = set()
+        self._chat_sending = set()
+
+        # Статистика очереди
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    # Запустить обработку очереди (если ещё не запущена)
+    def start(self):
+        if self._worker is None or self._worker.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue()
+            self._worker = asyncio.ensure_future(self._run())
+
+    # Остановить обработку очереди, дождавшись её опустошения
+    async def stop(self, timeout: float=10):
+        """Входной параметр:
+        timeout: float - максимальное время ожидания отправки оставшихся
+        сообщений (секунды).
+        """
+        deadline = time.monotonic() + timeout
+        while self.get_depth() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    # Поставить сообщение в очередь на отправку
+    async def put(self, chat_id, text: str, **kwargs) -> asyncio.Future:
+        """Входные параметры:
+        chat_id - идентификатор чата Telegram;
+        text: str - текст сообщения;
+        kwargs - прочие параметры для Bot.send_message().
+
+        Возвращаемое значение:
+        объект Future, который получает результат True, когда сообщение
+        фактически отправлено, или False, когда от отправки отказались (после
+        MAX_RETRIES неудачных попыток или при постоянной ошибке). Ожидать его
+        не обязательно.
+        """
+        self.start()
+        future = asyncio.get_event_loop().create_future()
+        await self._queue.put({
+            'chat_id': chat_id,
+            'text': text,
+            'kwargs': kwargs,
+            'created': time.monotonic(),
+            'attempts': 0,
+            'future': future,
+        })
+        return future
+
+    # Получить число сообщений, ещё не отправленных окончательно
+    def get_depth(self) -> int:
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + self._delayed + len(self._sending)
+
+    # Получить статистику очереди
+    def get_stats(self) -> dict:
+        """Возвращаемое значение:
+        dict('depth': int - число сообщений в очереди;
+             'sent': int - число отправленных сообщений;
+             'failed': int - число сообщений, отправить которые не удалось;
+             'retried': int - число повторных попыток отправки;
+             'latency_avg': float - среднее время от постановки в очередь до
+             отправки (секунды);
+             'latency_max': float - максимальное время от постановки в очередь
+             до отправки (секунды))
+        """
+        return {
+            'depth': self.get_depth(),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'latency_avg': self.latency_total / self.sent if self.sent else 0.0,
+            'latency_max': self.latency_max,
+        }
+
+    # Отложить сообщение на заданное время (секунды). Отложенное сообщение
+    # становится первым в очереди своего чата: пока оно не отправлено, более
+    # поздние сообщения в тот же чат также откладываются, поэтому порядок
+    # сообщений в каждом чате сохраняется
+    def _defer(self, item: dict, delay: float):
+        item['not_before'] = time.monotonic() + delay
+        pending = self._chat_pending.setdefault(item['chat_id'], deque())
+        pending.appendleft(item)
+        self._delayed += 1
+        self._schedule_release(item['chat_id'], delay)
+
+    # Запланировать возврат первого отложенного сообщения чата в общую
+    # очередь (если возврат ещё не запланирован)
+    def _schedule_release(self, chat_id, delay: float):
+        if chat_id not in self._chat_release:
+            self._chat_release[chat_id] = asyncio.get_event_loop().call_later(
+                delay, self._release, chat_id)
+
+    # Вернуть первое отложенное сообщение чата в общую очередь
+    def _release(self, chat_id):
+        self._chat_release.pop(chat_id, None)
+        pending = self._chat_pending.get(chat_id)
+        if not pending:
+            self._chat_pending.pop(chat_id, None)
+            return
+
+        wait = pending[0].get('not_before', 0) - time.monotonic()
+        if wait > 0:
+            self._schedule_release(chat_id, wait)
+            return
+
+        item = pending.popleft()
+        self._delayed -= 1
+        item['released'] = True
+        self._queue.put_nowait(item)
+
+    # Основной цикл обработки очереди
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            chat_id = item['chat_id']
+
+            # Пока в чат отправляется сообщение, следующие сообщения в него
+            # ждут завершения отправки (см. _send()); пока у чата есть
+            # отложенные сообщения, новые сообщения в него встают за ними
+            released = item.pop('released', False)
+            if chat_id in self._chat_sending:
+                pending = self._chat_pending.setdefault(chat_id, deque())
+                if released:
+                    pending.appendleft(item)
+                else:
+                    pending.append(item)
+                self._delayed += 1
+                continue
+
+            pending = self._chat_pending.get(chat_id)
+            if pending is not None and not released:
+                pending.append(item)
+                self._delayed += 1
+                continue
+
+            now = time.monotonic()
+            if self._paused_until > now:
+                await asyncio.sleep(self._paused_until - now)
+                now = time.monotonic()
+
+            # Сообщение в чат, куда недавно уже отправляли, откладывается, не
+            # задерживая сообщения в другие чаты
+            chat_next = self._chat_next.get(chat_id, 0)
+            if chat_next > now:
+                self._defer(item, chat_next - now)
+                continue
+
+            # Следующее отложенное сообщение чата возвращается в очередь по
+            # завершении отправки этого (см. _send())
+            if pending is not None and not pending:
+                del self._chat_pending[chat_id]
+
+            if len(self._chat_next) > CHAT_TABLE_SIZE:
+                self._chat_next = {chat_id: next_time for chat_id, next_time
+                                   in self._chat_next.items() if next_time > now}
+            self._chat_next[chat_id] = now + self.chat_interval
+            self._chat_sending.add(chat_id)
+
+            await self._limiter.acquire()
+
+            task = asyncio.ensure_future(self._send(item))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    # Отправить одно сообщение из очереди
+    async def _send(self, item: dict):
+        try:
+            await self._try_send(item)
+        finally:
+            # Отправка в чат завершена (успешно, с отказом или с повтором
+            # позже): следующее сообщение чата можно возвращать в очередь
+            chat_id = item['chat_id']
+            self._chat_sending.discard(chat_id)
+            if self._chat_pending.get(chat_id):
+                self._schedule_release(chat_id, max(
+                    0, self._chat_next.get(chat_id, 0) - time.monotonic()))
+
+    # Выполнить одну попытку отправки сообщения
+    async def _try_send(self, item: dict):
+        try:
+            await self.bot.send_message(item['chat_id'], item['text'],
+                                        **item['kwargs'])
+        except RetryAfter as e:
+            logging.warning(e)
+            self.retried += 1
+            self._paused_until = max(self._paused_until,
+                                     time.monotonic() + e.timeout)
+            self._defer(item, e.timeout)
+        except (NetworkError, RestartingTelegram, aiohttp.ClientError,
+                asyncio.TimeoutError) as e:
+            item['attempts'] += 1
+            if item['attempts'] > self.max_retries:
+                logging.error(f'Не удалось отправить сообщение: {e}')
+                self.failed += 1
+                self._complete(item, False)
+            else:
+                self.retried += 1
+                self._defer(item, RETRY_DELAY * 2 ** (item['attempts'] - 1))
+        except Exception as e:
+            logging.error(e)
+            self.failed += 1
+            self._complete(item, False)
+        else:
+            latency = time.monotonic() - item['created']
+            self.sent += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self._complete(item, True)
+
+    # Сообщить результат окончательной отправки сообщения (см. put())
+    def _complete(self, item: dict, sent: bool):
+        future = item.get('future')
+        if future is not None and not future.done():
+            future.set_result(sent)
+
+class EmailSender:
+    """Отправитель e-mail через постоянное SMTP-соединение. Соединение
+    устанавливается при первой отправке, используется для многих писем и
+    переустанавливается при обрыве. Все SMTP-операции выполняются в отдельном
+    потоке.
+
+    server: str - адрес SMTP-сервера;
+    port: int - порт SMTP-сервера;
+    user: str - имя пользователя (e-mail) для авторизации; если пусто, то
+    авторизация не выполняется;
+    password: str - пароль для авторизации;
+    starttls: bool - использовать ли STARTTLS.
+    """
+    def __init__(self, server: str, port: int, user: str='', password: str='',
+                 starttls: bool=True):
+        self.server = server
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+
+        self._smtp = None
+        self._session_messages = 0
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+        # Статистика отправки
+        self.sent = 0
+        self.failed = 0
+        self.reconnects = 0
+
+    # Установить SMTP-соединение (выполняется в потоке отправителя)
+    def _connect(self):
+        self._disconnect()
+
+        smtp = smtplib.SMTP(self.server, self.port, timeout=SMTP_TIMEOUT)
+        try:
+            if self.starttls:
+                smtp.starttls(context=ssl.create_default_context())
+            if self.user:
+                smtp.login(self.user, self.password)
+        except Exception:
+            smtp.close()
+            raise
+
+        self._smtp = smtp
+        self._session_messages = 0
+        self.reconnects += 1
+
+    # Закрыть SMTP-соединение (выполняется в потоке отправителя)
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+    # Отправить письмо, при необходимости переустановив соединение
+    # (выполняется в потоке отправителя)
+    def send_sync(self, receiver: str, message) -> bool:
+        """Входные параметры:
+        receiver: str - адрес получателя письма;
+        message - письмо (email.message.Message).
+        """
+        for attempt in range(0, 2):
+            try:
+                if (self._smtp is None
+                        or self._session_messages >= SMTP_SESSION_MESSAGES):
+                    self._connect()
+                self._smtp.sendmail(self.user, receiver, message.as_string())
+            except (smtplib.SMTPServerDisconnected,
+                    smtplib.SMTPConnectError) as e:
+                # Обрыв соединения: повторить попытку с новым соединением
+                logging.warning(e)
+                self._disconnect()
+            except smtplib.SMTPException as e:
+                logging.error(e)
+                break
+            except OSError as e:
+                # Сетевой сбой: повторить попытку с новым соединением
+                logging.warning(e)
+                self._disconnect()
+            else:
+                self._session_messages += 1
+                self.sent += 1
+                return True
+
+        self.failed += 1
+        return False
+
+    # Отправить письмо, не блокируя цикл событий
+    async def send(self, receiver: str, message) -> bool:
+        """Входные параметры - см. send_sync().
+        """
+        return await asyncio.get_event_loop().run_in_executor(
+            self._executor, self.send_sync, receiver, message)
+
+    # Закрыть SMTP-соединение и остановить поток отправителя
+    async def close(self):
+        await asyncio.get_event_loop().run_in_executor(self._executor,
+                                                       self._disconnect)
+        self._executor.shutdown(wait=False)
+
+    # Получить статистику отправки
+    def get_stats(self) -> dict:
+        """Возвращаемое значение:
+        dict('sent': int - число отправленных писем;
+             'failed': int - число писем, отправить которые не удалось;
+             'reconnects': int - число установленных SMTP-соединений)
+        """
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'reconnects': self.reconnects,
+        }
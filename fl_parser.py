@@ -4,10 +4,23 @@
 import logging
 import time
 import re
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from itertools import compress
 from html import unescape
+from types import MappingProxyType
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
 
 import requests
-from bs4 import BeautifulSoup
+import aiohttp
+from bs4 import BeautifulSoup, SoupStrainer
+
+from config import CATLIST_REFRESH_PERIOD, CATLIST_RETRY_PERIOD
+from throttling import TokenBucket
 
 # Время ожидания ответа от веб-сервера (секунды)
 TIMEOUT = 5
@@ -18,6 +31,47 @@ MAX_RETRIES = 3
 # Опциональная задержка после выполнения http-запроса (секунды)
 SLEEP_TIME = 1
 
+# Максимальное число одновременных соединений в пуле асинхронных запросов:
+# всего и для каждого сайта в отдельности
+CONNECTIONS_LIMIT = 10
+CONNECTIONS_PER_HOST = 2
+
+# Движок разбора HTML для списков проектов: 'lxml' (значительно быстрее, если
+# установлен пакет lxml) или встроенный 'html.parser'
+try:
+    import lxml
+except ImportError:
+    PARSER_BACKEND = 'html.parser'
+else:
+    PARSER_BACKEND = 'lxml'
+
+# Максимальное число запросов списков проектов, для которых запоминаются
+# валидаторы (ETag, Last-Modified), хеш и результат разбора страницы
+PAGE_CACHE_SIZE = 1000
+
+# Время жизни (секунды) и максимальный размер кеша результатов
+# get_jobs_async(). Защищает биржи от повторных запросов (например, при частом
+# вызове команды /update)
+JOBS_CACHE_TTL = 60
+JOBS_CACHE_SIZE = 500
+
+# Число страниц списка проектов, запрашиваемых одновременно с обрабатываемой
+# при постраничном обходе (см. _crawl_jobs_async()); частоту запросов при
+# этом по-прежнему ограничивает RATE_LIMITS
+CRAWL_PREFETCH_PAGES = 2
+
+# Максимальное число обходимых страниц списка проектов FL.ru. Список FL.ru
+# фильтруется POST-запросом, и передача в нём номера страницы не подтверждена
+# (сайт может отдавать первую страницу на любой запрос), поэтому обходится
+# только первая страница. Постраничный обход выполняется для Freelance.ua
+# (параметр page адреса списка проектов)
+CRAWL_MAX_PAGES_FL_RU = 1
+
+# Файл снимка деревьев категорий, загружаемого при запуске вместо запросов к
+# биржам, и версия его формата (снимки других версий игнорируются)
+CAT_SNAPSHOT_NAME = 'categories.json'
+CAT_SNAPSHOT_VERSION = 1
+
 # Заголовки http-запроса
 HEADERS = {
     'user-agent': ('Mozilla/5.0 (Windows NT 6.1; rv:84.0) Gecko/20100101 '
@@ -33,6 +87,15 @@ URL_JOBS_FL_UA = 'https://freelance.ua/orders/'
 HOST_FL_UA = 'https://freelance.ua'
 HOSTS = [HOST_FL_RU, HOST_FL_UA]
 
+# Ограничение частоты запросов к сайтам бирж фриланса (во избежание 'бана'):
+# rate - средняя частота запросов (запросов в секунду), burst - число запросов
+# подряд без ожидания, jitter - максимальная случайная добавка к ожиданию
+# (секунды). Подробнее - см. throttling.TokenBucket
+RATE_LIMITS = {
+    HOST_FL_RU: {'rate': 1 / 4, 'burst': 2, 'jitter': 4},
+    HOST_FL_UA: {'rate': 1 / 4, 'burst': 2, 'jitter': 4},
+}
+
 """Структура категорий для проектов биржи фриланса в общем случае имеет вид:
 [
     {
@@ -75,12 +138,29 @@ categories_fl_ru = [
 
 categories_fl_ua = []
 
+"""Индексы дерева категорий каждого сайта (см. build_cat_index()) для поиска
+за O(1) вместо перебора списков categories_fl_ru и categories_fl_ua. Индексы
+неизменяемы и перестраиваются целиком при каждом построении дерева категорий.
+"""
+_cat_indexes = {}
+
+# Битовые позиции идентификаторов, отсутствующих в дереве категорий сайта
+# (например, удалённых с сайта категорий из старых фильтров); назначаются
+# следом за позициями из индекса и сбрасываются при его перестроении
+_extra_bits = {}
+
 CATEGORY_RE = re.compile(r'filter_specs\[(\d+)\]=\[(\[[^;]+\])\]')
 SUBCAT_RE = re.compile(r'\[([^\[\]]+)\]')
 PRICE_RE = re.compile(
     r'<script.+<div class="b-post__price.+>(.+)</div>.+</script>')
 DESCRIPTION_RE = re.compile(
     r'<script.+<div class="b-post__txt[^<]+>([^<]+)</div>.+</script>')
+JOB_ID_RE = re.compile(r'/(?:projects|orders)/(\d+)')
+
+# Начало записи о проекте на странице FL.ru и заголовок записи о проекте на
+# странице Freelance.ua (см. _split_posts())
+POST_RE_FL_RU = re.compile(r'<div\b[^>]*\bclass="b-post[\s"]')
+POST_TITLE_RE_FL_UA = re.compile(r'class="l-project-title[\s"]')
 
 # Преобразовать URL сайта в хештег для Telegram
 def host_to_hashtag(host: str) -> str:
@@ -95,6 +175,44 @@ def clean_text(text: str) -> str:
 def remove_spaces(text: str) -> str:
     return ''.join(text.split())
 
+"""Далее следуют функции выполнения http-запросов. Блокирующая функция
+get_html() предназначена для скриптов и начальной инициализации, асинхронная
+get_html_async() - для работы внутри цикла событий бота. Обе используют
+постоянные (keep-alive) соединения. Cookie не сохраняются, чтобы фильтр
+проектов одного запроса не влиял на результаты другого.
+"""
+
+# Ограничители частоты запросов для каждого сайта из HOSTS
+_limiters = {host: TokenBucket(**RATE_LIMITS[host]) for host in HOSTS}
+
+# Получить ограничитель частоты запросов для web-страницы (None, если сайт
+# страницы не входит в HOSTS)
+def _get_limiter(url: str) -> TokenBucket:
+    netloc = urlsplit(url).netloc
+    for host, limiter in _limiters.items():
+        if urlsplit(host).netloc == netloc:
+            return limiter
+    return None
+
+# Получить статистику ожиданий ограничителей частоты запросов
+def get_rate_stats() -> dict:
+    """Возвращаемое значение:
+    {
+        host: dict - статистика для сайта host (см. TokenBucket.get_stats()),
+        ... ... ...
+    }
+    """
+    return {host: limiter.get_stats() for host, limiter in _limiters.items()}
+
+# Сессия для блокирующих http-запросов
+_session = requests.Session()
+_session.headers.update(HEADERS)
+_session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+# Сессия (пул соединений) для асинхронных http-запросов; создаётся при первом
+# обращении из цикла событий
+_async_session = None
+
 # Получить текстовый контент web-страницы
 def get_html(url: str, params: dict=None, data: dict=None,
              delay: bool=False) -> str:
@@ -108,14 +226,17 @@ def get_html(url: str, params: dict=None, data: dict=None,
     Замечание: если параметр data имеет непустое значение, то будет выполнен
     POST-запрос. В противном случае выполнится запрос GET.
     """
+    limiter = _get_limiter(url)
+
     for attempt in range(0, MAX_RETRIES):
+        if limiter:
+            limiter.acquire_sync()
+
         try:
             if data:
-                r = requests.post(url, headers=HEADERS, timeout=TIMEOUT,
-                                  data=data)
+                r = _session.post(url, timeout=TIMEOUT, data=data)
             else:
-                r = requests.get(url, headers=HEADERS, timeout=TIMEOUT,
-                                 params=params)
+                r = _session.get(url, timeout=TIMEOUT, params=params)
         except requests.exceptions.RequestException:
             r = False
             time.sleep(SLEEP_TIME)
@@ -134,6 +255,255 @@ def get_html(url: str, params: dict=None, data: dict=None,
 
     return r.text
 
+# Получить сессию для асинхронных http-запросов
+def _get_async_session() -> aiohttp.ClientSession:
+    global _async_session
+
+    if _async_session is None or _async_session.closed:
+        _async_session = aiohttp.ClientSession(
+            headers=HEADERS,
+            timeout=aiohttp.ClientTimeout(total=TIMEOUT),
+            connector=aiohttp.TCPConnector(limit=CONNECTIONS_LIMIT,
+                                           limit_per_host=CONNECTIONS_PER_HOST),
+            cookie_jar=aiohttp.DummyCookieJar())
+
+    return _async_session
+
+# Закрыть сессию асинхронных http-запросов (при завершении работы)
+async def close_session():
+    global _async_session
+
+    if _async_session is not None and not _async_session.closed:
+        await _async_session.close()
+    _async_session = None
+
+# Выполнить http-запрос, не блокируя цикл событий
+async def _request_async(url: str, params: dict=None, data: dict=None,
+                         headers: dict=None) -> tuple:
+    """Входные параметры - см. get_html(); headers: dict - дополнительные
+    заголовки http-запроса.
+
+    Возвращаемое значение:
+    (status, text, response_headers); status равен None, если запрос
+    выполнить не удалось.
+    """
+    text = None
+    status = None
+    response_headers = {}
+    limiter = _get_limiter(url)
+
+    for attempt in range(0, MAX_RETRIES):
+        if limiter:
+            await limiter.acquire()
+
+        try:
+            if data:
+                request = _get_async_session().post(url, data=data,
+                                                    headers=headers)
+            else:
+                request = _get_async_session().get(url, params=params,
+                                                   headers=headers)
+
+            async with request as r:
+                status = r.status
+                response_headers = r.headers
+                text = await r.text(errors='replace')
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            status = None
+            await asyncio.sleep(SLEEP_TIME)
+        else:
+            break
+
+    return (status, text, response_headers)
+
+# Получить текстовый контент web-страницы, не блокируя цикл событий
+async def get_html_async(url: str, params: dict=None, data: dict=None) -> str:
+    """Входные параметры - см. get_html().
+    """
+    status, text, response_headers = await _request_async(url, params, data)
+
+    if status is None:
+        logging.error('Не удалось выполнить http-запрос.')
+        return False
+
+    if status != 200:
+        logging.error(f'Ошибка {status} при обращении к web-странице.')
+        return False
+
+    return text
+
+"""Далее следуют функции, позволяющие не разбирать повторно неизменившиеся
+страницы со списками проектов. Для каждого запроса запоминаются валидаторы
+(ETag, Last-Modified), которые сервер может прислать, и хеш фрагмента страницы
+со списком проектов. Если сервер ответил 304 Not Modified или хеш не
+изменился, то возвращается результат предыдущего разбора страницы, и новых
+проектов относительно предыдущего запроса в нём заведомо нет. Валидаторы
+отправляются только в GET-запросах: на POST-запрос (форма фильтра FL.ru) с
+совпавшим If-None-Match сервер вправе ответить 412 Precondition Failed, поэтому
+для таких запросов используется только хеш.
+"""
+
+# Границы фрагмента страницы со списком проектов: маркер начала списка и
+# маркер блока, следующего за списком (постраничная навигация)
+LISTING_BOUNDS = {
+    'fl_ru': ('class="b-post', 'b-pager'),
+    'fl_ua': ('class="l-projectList', 'pagination'),
+}
+
+# Сохранённые сведения о страницах со списками проектов по ключам запросов
+_page_cache = OrderedDict()
+
+# Сформировать ключ запроса для кеша страниц
+def _get_request_key(request: dict) -> tuple:
+    fields = request.get('data') or request.get('params') or {}
+    return (request['url'], tuple(sorted(fields.items())))
+
+# Вычислить хеш фрагмента страницы со списком проектов
+def _get_listing_hash(html: str, bounds: tuple) -> str:
+    begin = html.find(bounds[0])
+    if begin < 0:
+        begin = 0
+    end = html.find(bounds[1], begin)
+    if end < 0:
+        end = len(html)
+    return hashlib.sha1(html[begin:end].encode('utf-8')).hexdigest()
+
+# Получить список проектов по запросу, пропуская разбор неизменившейся
+# страницы
+async def _get_jobs_async(request: dict, parse_func, iter_func,
+                          bounds: tuple) -> list:
+    """Входные параметры:
+    request: dict - параметры запроса (см. get_request_fl_ru());
+    parse_func - функция разбора страницы (parse_jobs_fl_ru или
+    parse_jobs_fl_ua);
+    iter_func - функция постепенного разбора страницы (iter_jobs_fl_ru или
+    iter_jobs_fl_ua);
+    bounds: tuple - границы фрагмента со списком проектов (см.
+    LISTING_BOUNDS).
+
+    Если страница изменилась с прошлого запроса, то заново разбираются только
+    записи о проектах, которых не было в прошлом результате разбора.
+    """
+    key = _get_request_key(request)
+    entry = _page_cache.get(key)
+
+    headers = {}
+    if entry:
+        _page_cache.move_to_end(key)
+    if entry and not request.get('data'):
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    status, html, response_headers = await _request_async(headers=headers,
+                                                          **request)
+
+    if status == 304 and entry:
+        return list(entry['jobs'])
+
+    if status is None:
+        logging.error('Не удалось выполнить http-запрос.')
+        return []
+
+    if status != 200:
+        logging.error(f'Ошибка {status} при обращении к web-странице.')
+        return []
+
+    listing_hash = _get_listing_hash(html, bounds)
+    if entry and entry['hash'] == listing_hash:
+        jobs = entry['jobs']
+    elif entry:
+        known_jobs = {get_job_key(job['url']): job for job in entry['jobs']
+                      if 'url' in job and not job.get('pinned', False)}
+        jobs = list(iter_func(html, known_jobs=known_jobs))
+        if not jobs:
+            # Записи не удалось выделить (например, изменилась вёрстка)
+            jobs = parse_func(html)
+    else:
+        jobs = parse_func(html)
+
+    _page_cache[key] = {
+        'etag': response_headers.get('ETag', ''),
+        'last_modified': response_headers.get('Last-Modified', ''),
+        'hash': listing_hash,
+        'jobs': jobs,
+    }
+    _page_cache.move_to_end(key)
+    while len(_page_cache) > PAGE_CACHE_SIZE:
+        _page_cache.popitem(last=False)
+
+    return list(jobs)
+
+# Сформировать параметры запроса заданной страницы списка проектов
+def _get_page_request(request: dict, page: int) -> dict:
+    page_request = dict(request)
+    field = 'data' if 'data' in request else 'params'
+    page_request[field] = dict(request.get(field) or {}, page=str(page))
+    return page_request
+
+# Получить список проектов по запросу, обходя страницы списка по порядку до
+# страницы, на которой проекты уже известны всем получателям ленты
+async def _crawl_jobs_async(request: dict, parse_func, iter_func,
+                            bounds: tuple, max_pages: int,
+                            seen_jobs=()) -> list:
+    """Входные параметры:
+    request, parse_func, iter_func, bounds - см. _get_jobs_async();
+    max_pages: int - максимальное число обходимых страниц;
+    seen_jobs - последовательность множеств (или словарей) ключей проектов
+    (см. get_job_key()), просмотренных каждым из получателей ленты.
+
+    Обход заканчивается на странице, после которой в каждом непустом
+    множестве из seen_jobs встретился хотя бы один из полученных проектов, на
+    странице без новых для этого обхода проектов (пустой или повторяющей
+    предыдущую, если сайт не учитывает номер страницы) или по достижении
+    max_pages. Если непустых множеств нет (получатели ленты ещё ничего не
+    просматривали), запрашивается только первая страница. Первая страница
+    запрашивается одна, так как обычно новые проекты на ней и заканчиваются;
+    следующие страницы запрашиваются заранее, по CRAWL_PREFETCH_PAGES
+    одновременно. Проекты, сместившиеся за время обхода на следующую
+    страницу, не дублируются.
+    """
+    pending = [seen for seen in seen_jobs if seen]
+    if not pending:
+        max_pages = 1
+
+    tasks = {}
+    jobs = []
+    job_keys = set()
+    try:
+        for page in range(1, max_pages + 1):
+            if page > 1:
+                for next_page in range(page, min(page + CRAWL_PREFETCH_PAGES,
+                                                 max_pages) + 1):
+                    if next_page not in tasks:
+                        tasks[next_page] = asyncio.ensure_future(
+                            _get_jobs_async(
+                                _get_page_request(request, next_page),
+                                parse_func, iter_func, bounds))
+                page_jobs = await tasks.pop(page)
+            else:
+                page_jobs = await _get_jobs_async(request, parse_func,
+                                                  iter_func, bounds)
+
+            page_count = len(jobs)
+            for job in page_jobs:
+                job_key = get_job_key(job['url'])
+                if job_key in job_keys:
+                    continue
+                job_keys.add(job_key)
+                jobs.append(job)
+                if pending and not job.get('pinned'):
+                    pending = [seen for seen in pending if job_key not in seen]
+
+            if not pending or len(jobs) == page_count:
+                break
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+    return jobs
+
 """Назначение двух последующих функций в том, чтобы преодолеть проблему
 неуникальности идентификатора подкатегории самого по себе. Эта особенность
 характерна как для FL.ru, так и для Freelance.ua.
@@ -153,43 +523,228 @@ def split_cat_ids(combined_ids: str) -> dict:
         'subcategory_id': str(int(combined_ids[4:]))
     }
 
-# Построить структуру категорий (и подкатегорий) для сайта FL.ru, записав её
-# в глобальную переменную categories_fl_ru
-def build_catlist_fl_ru() -> bool:
-    html = get_html(URL_JOBS_FL_RU)
+# Получить дерево категорий сайта host
+def _get_cat_tree(host: str) -> list:
+    if host == HOST_FL_RU:
+        return categories_fl_ru
+    elif host == HOST_FL_UA:
+        return categories_fl_ua
+    else:
+        return []
 
-    if not html:
-        logging.error(f'Нет доступа к странице проектов {URL_JOBS_FL_RU}.')
+# Построить индексы дерева категорий сайта host
+def build_cat_index(host: str) -> MappingProxyType:
+    """Возвращаемое значение (неизменяемый словарь):
+    {
+        'order': tuple - идентификаторы категорий верхнего уровня в исходном
+        порядке;
+        'children': идентификатор категории -> tuple идентификаторов её
+        подкатегорий;
+        'nodes': идентификатор категории или подкатегории -> её описание без
+        списка подкатегорий (см. структуру категорий выше);
+        'parents': идентификатор подкатегории -> идентификатор категории;
+        'keywords': идентификатор подкатегории -> ключевое слово (только для
+        подкатегорий, у которых оно есть);
+        'titles': идентификатор категории или подкатегории -> заголовок;
+        'bits': идентификатор категории или подкатегории -> номер бита в
+        битовых масках фильтров (см. get_cat_mask()); номера плотные и
+        назначаются в порядке обхода дерева;
+        'masks': идентификатор категории -> битовая маска категории вместе со
+        всеми её подкатегориями
+    }
+    Все вложенные словари также неизменяемы.
+    """
+    categories = _get_cat_tree(host)
+
+    children = {}
+    nodes = {}
+    parents = {}
+    keywords = {}
+    titles = {}
+    bits = {}
+    for cat in categories:
+        nodes[cat['id']] = MappingProxyType(
+            {'id': cat['id'], 'title': cat['title']})
+        titles[cat['id']] = cat['title']
+        bits.setdefault(cat['id'], len(bits))
+        children[cat['id']] = tuple(subcat['id']
+                                    for subcat in cat['children'])
+
+        for subcat in cat['children']:
+            nodes[subcat['id']] = MappingProxyType(dict(subcat))
+            parents[subcat['id']] = cat['id']
+            titles[subcat['id']] = subcat['title']
+            bits.setdefault(subcat['id'], len(bits))
+            if 'keyword' in subcat:
+                keywords[subcat['id']] = subcat['keyword']
+
+    index = MappingProxyType({
+        'order': tuple(cat['id'] for cat in categories),
+        'children': MappingProxyType(children),
+        'nodes': MappingProxyType(nodes),
+        'parents': MappingProxyType(parents),
+        'keywords': MappingProxyType(keywords),
+        'titles': MappingProxyType(titles),
+        'bits': MappingProxyType(bits),
+        'masks': MappingProxyType({
+            cat_id: sum(1 << bits[subcat_id] for subcat_id in subcat_ids)
+                    | 1 << bits[cat_id]
+            for cat_id, subcat_ids in children.items()}),
+    })
+
+    _cat_indexes[host] = index
+    _extra_bits[host] = {}
+    return index
+
+# Получить индексы дерева категорий сайта host (см. build_cat_index())
+def get_cat_index(host: str) -> MappingProxyType:
+    index = _cat_indexes.get(host)
+    if index is None:
+        index = build_cat_index(host)
+    return index
+
+# Вычислить изменения дерева категорий сайта host между двумя индексами
+def diff_cat_index(old_index: MappingProxyType,
+                   new_index: MappingProxyType) -> dict:
+    """Входные параметры:
+    old_index, new_index: MappingProxyType - индексы дерева категорий до и
+    после изменения (см. build_cat_index()).
+
+    Возвращаемое значение:
+    dict('added': list - идентификаторы добавленных категорий и подкатегорий;
+         'removed': list - идентификаторы удалённых категорий и подкатегорий;
+         'renamed': list - идентификаторы категорий и подкатегорий с
+         изменившимся заголовком)
+    """
+    old_titles = old_index['titles']
+    new_titles = new_index['titles']
+    return {
+        'added': [cat_id for cat_id in new_titles if cat_id not in old_titles],
+        'removed': [cat_id for cat_id in old_titles
+                    if cat_id not in new_titles],
+        'renamed': [cat_id for cat_id, title in new_titles.items()
+                    if cat_id in old_titles and old_titles[cat_id] != title],
+    }
+
+# Записать в журнал изменения дерева категорий сайта host
+def _log_cat_diff(host: str, old_index: MappingProxyType,
+                  new_index: MappingProxyType):
+    # Первоначальное построение дерева изменением не считается
+    if not old_index['parents']:
+        return
+
+    diff = diff_cat_index(old_index, new_index)
+    if not any(diff.values()):
+        return
+
+    logging.info(f'Структура категорий сайта {host} изменилась: добавлено '
+                 f'{len(diff["added"])}, удалено {len(diff["removed"])}, '
+                 f'переименовано {len(diff["renamed"])}.')
+    for cat_id in diff['added']:
+        logging.info(f'Добавлена категория {host} {cat_id}: '
+                     f'{new_index["titles"][cat_id]}')
+    for cat_id in diff['removed']:
+        logging.info(f'Удалена категория {host} {cat_id}: '
+                     f'{old_index["titles"][cat_id]}')
+    for cat_id in diff['renamed']:
+        logging.info(f'Переименована категория {host} {cat_id}: '
+                     f'{old_index["titles"][cat_id]} -> '
+                     f'{new_index["titles"][cat_id]}')
+
+# Заменить дерево категорий сайта host новым деревом
+def set_cat_tree(host: str, categories: list) -> bool:
+    """Новое дерево должно быть построено заранее и после замены не должно
+    изменяться. Замена дерева, перестроение индексов и сброс зависящих от
+    дерева кешей выполняются без передачи управления циклу событий, поэтому
+    другие сопрограммы видят либо старое дерево целиком, либо новое. Пустое
+    дерево не устанавливается.
+
+    Возвращаемое значение:
+    True, если дерево заменено; иначе False.
+    """
+    global categories_fl_ru, categories_fl_ua
+
+    if not categories:
+        logging.error(f'Получен пустой список категорий сайта {host}, '
+                      'прежний список сохранён.')
         return False
 
-    search_results = re.findall(CATEGORY_RE, html)
-    for result in search_results:
-        for category in categories_fl_ru:
-            if category['id'] == result[0]:
-                category['children'] = []
-                subsearch_results = re.findall(SUBCAT_RE, result[1])
-                for subresult in subsearch_results:
-                    id_, title = subresult.split(',', 1)
-                    id_ = combine_cat_ids(category_id=category['id'],
-                                          subcategory_id=id_.strip())
-                    category['children'].append({
-                        'id': id_,
-                        'title': title.replace("'", '').strip()
-                    })
-                continue
+    old_index = get_cat_index(host)
+    if host == HOST_FL_RU:
+        categories_fl_ru = categories
+    elif host == HOST_FL_UA:
+        categories_fl_ua = categories
+    else:
+        return False
+
+    new_index = build_cat_index(host)
+    _log_cat_diff(host, old_index, new_index)
 
+    # Кешированные результаты запросов по категориям могли устареть
+    for key in [key for key in _jobs_cache if key[0] == host]:
+        del _jobs_cache[key]
     return True
 
-# Построить структуру категорий (и подкатегорий) для сайта Freelance.ua,
-# записав её в глобальную переменную categories_fl_ua
-def build_catlist_fl_ua() -> bool:
-    html = get_html(URL_JOBS_FL_UA)
+# Разобрать страницу проектов сайта FL.ru и построить по ней новое дерево
+# категорий (и подкатегорий); текущее дерево categories_fl_ru не изменяется
+def parse_cattree_fl_ru(html: str) -> list:
+    """Возвращаемое значение:
+    новое дерево категорий (см. структуру категорий выше) или None, если
+    страница недоступна. Список категорий верхнего уровня берётся из
+    текущего дерева; подкатегории категорий, не найденных на странице,
+    сохраняются прежними.
+    """
+    if not html:
+        logging.error(f'Нет доступа к странице проектов {URL_JOBS_FL_RU}.')
+        return None
+
+    children = {}
+    for result in re.findall(CATEGORY_RE, html):
+        children[result[0]] = []
+        for subresult in re.findall(SUBCAT_RE, result[1]):
+            id_, title = subresult.split(',', 1)
+            children[result[0]].append({
+                'id': combine_cat_ids(category_id=result[0],
+                                      subcategory_id=id_.strip()),
+                'title': title.replace("'", '').strip()
+            })
+
+    return [{
+        'id': category['id'],
+        'title': category['title'],
+        'children': children.get(category['id'],
+                                 [dict(subcat) for subcat
+                                  in category['children']]),
+        } for category in categories_fl_ru]
+
+# Разобрать страницу проектов сайта FL.ru, записав структуру категорий
+# (и подкатегорий) в глобальную переменную categories_fl_ru
+def parse_catlist_fl_ru(html: str) -> bool:
+    categories = parse_cattree_fl_ru(html)
+    return categories is not None and set_cat_tree(HOST_FL_RU, categories)
+
+# Построить структуру категорий (и подкатегорий) для сайта FL.ru, записав её
+# в глобальную переменную categories_fl_ru
+def build_catlist_fl_ru() -> bool:
+    return parse_catlist_fl_ru(get_html(URL_JOBS_FL_RU))
 
+# Асинхронная версия build_catlist_fl_ru()
+async def build_catlist_fl_ru_async() -> bool:
+    return parse_catlist_fl_ru(await get_html_async(URL_JOBS_FL_RU))
+
+# Разобрать страницу проектов сайта Freelance.ua и построить по ней новое
+# дерево категорий (и подкатегорий); текущее дерево categories_fl_ua не
+# изменяется
+def parse_cattree_fl_ua(html: str) -> list:
+    """Возвращаемое значение:
+    новое дерево категорий (см. структуру категорий выше) или None, если
+    страница недоступна.
+    """
     if not html:
         logging.error(f'Нет доступа к странице проектов {URL_JOBS_FL_UA}.')
-        return False
+        return None
 
-    categories_fl_ua.clear()
+    new_categories = []
     soup = BeautifulSoup(html, 'html.parser')
 
     left_catlist = soup.find(
@@ -223,50 +778,61 @@ def build_catlist_fl_ua() -> bool:
                         }
                         new_cat['children'].append(new_child)
 
-            categories_fl_ua.append(new_cat)
+            new_categories.append(new_cat)
 
-    return True
+    return new_categories
+
+# Разобрать страницу проектов сайта Freelance.ua, записав структуру категорий
+# (и подкатегорий) в глобальную переменную categories_fl_ua
+def parse_catlist_fl_ua(html: str) -> bool:
+    categories = parse_cattree_fl_ua(html)
+    return categories is not None and set_cat_tree(HOST_FL_UA, categories)
+
+# Построить структуру категорий (и подкатегорий) для сайта Freelance.ua,
+# записав её в глобальную переменную categories_fl_ua
+def build_catlist_fl_ua() -> bool:
+    return parse_catlist_fl_ua(get_html(URL_JOBS_FL_UA))
+
+# Асинхронная версия build_catlist_fl_ua()
+async def build_catlist_fl_ua_async() -> bool:
+    return parse_catlist_fl_ua(await get_html_async(URL_JOBS_FL_UA))
 
 # Получить список категорий верхнего уровня для сайта FL.ru
 def get_catlist_fl_ru() -> list:
     """Возвращаемое значение:
     [{'id': str, 'title': str},...]
     """
-    return [{'id': cat['id'], 'title': cat['title']}
-            for cat in categories_fl_ru]
+    index = get_cat_index(HOST_FL_RU)
+    return [dict(index['nodes'][cat_id]) for cat_id in index['order']]
 
 # Получить список подкатегорий для заданной категории сайта FL.ru
 def get_subcatlist_fl_ru(category_id: str) -> list:
     """Возвращаемое значение:
     [{'id': str, 'title': str},...]
     """
-    for category in categories_fl_ru:
-        if category['id'] == category_id:
-            return [{'id': cat['id'], 'title': cat['title']}
-                    for cat in category['children']]
-    return []
+    index = get_cat_index(HOST_FL_RU)
+    return [{'id': subcat_id, 'title': index['titles'][subcat_id]}
+            for subcat_id in index['children'].get(category_id, ())]
 
 # Получить список категорий верхнего уровня для сайта Freelance.ua
 def get_catlist_fl_ua() -> list:
     """Возвращаемое значение:
     [{'id': str, 'title': str},...]
     """
-    return [{'id': cat['id'], 'title': cat['title']}
-            for cat in categories_fl_ua]
+    index = get_cat_index(HOST_FL_UA)
+    return [dict(index['nodes'][cat_id]) for cat_id in index['order']]
 
 # Получить список подкатегорий для заданной категории сайта Freelance.ua
 def get_subcatlist_fl_ua(category_id: str) -> list:
     """Возвращаемое значение:
     [{'id': str, 'title': str, 'keyword': str},...]
     """
-    for category in categories_fl_ua:
-        if category['id'] == category_id:
-            return [{
-                'id': cat['id'],
-                'title': cat['title'],
-                'keyword': cat['keyword']
-                } for cat in category['children']]
-    return []
+    index = get_cat_index(HOST_FL_UA)
+    return [{
+        'id': subcat_id,
+        'title': index['titles'][subcat_id],
+        'keyword': index['keywords'].get(subcat_id, ''),
+        } for subcat_id in index['children'].get(category_id, ())]
 
 # Получить список категорий верхнего уровня для сайта host
 def get_catlist(host: str) -> list:
@@ -299,18 +865,10 @@ def is_category_child(host: str, category_id: str,
     True - подкатегория является дочерней для указанной категории верхнего
     уровня. False - в противном случае.
     """
-    if host == HOST_FL_RU:
-        subcatlist = get_subcatlist_fl_ru(category_id)
-    elif host == HOST_FL_UA:
-        subcatlist = get_subcatlist_fl_ua(category_id)
-    else:
+    if host not in HOSTS:
         return False
 
-    for cat in subcatlist:
-        if cat['id'] == subcategory_id:
-            return True
-
-    return False
+    return get_cat_index(host)['parents'].get(subcategory_id) == category_id
 
 # Возвратить список всех идентификаторов для указанного списка категорий.
 # Структура списка категорий приведена в начале данного модуля
@@ -318,8 +876,8 @@ def get_cat_ids(categories: list) -> list:
     return [cat['id'] for cat in categories]
 
 # Возвратить список всех заголовков категорий и подкатегорий для сайта host
-def get_all_titles(host: str) -> dict:
-    """Возвращаемое значение:
+def get_all_titles(host: str) -> MappingProxyType:
+    """Возвращаемое значение (неизменяемый словарь):
     {
         'category_id_1': 'category_title_1',
         'category_id_2': 'category_title_2',
@@ -328,14 +886,7 @@ def get_all_titles(host: str) -> dict:
     }
     Ключи и значения строковые.
     """
-    result = {}
-
-    for cat in get_catlist(host):
-        result[cat['id']] = cat['title']
-        for subcat in get_subcatlist(host, cat['id']):
-            result[subcat['id']] = subcat['title']
-
-    return result
+    return get_cat_index(host)['titles']
 
 # Скомпоновать подкатегории в одну категорию верхнего уровня
 def assemble_catlist(host: str, category_ids: list,
@@ -355,33 +906,27 @@ def assemble_catlist(host: str, category_ids: list,
     Подкатегории, скомпоновавшие категорию верхнего уровня, не добавляются в
     новый список подкатегорий.
     """
+    index = get_cat_index(host)
+
     cat_ids = category_ids[:]
-    subcat_ids = subcategory_ids[:]
-    for cat in get_catlist(host):
+    selected = set(subcategory_ids)
+    for cat_id in index['order']:
         # Пропустить категорию, если она уже присутствует в списке category_ids
-        if cat['id'] in cat_ids:
+        if cat_id in cat_ids:
             continue
 
         # Проверить, смогут ли подкатегории из списка subcategory_ids
         # сформировать категорию верхнего уровня
-        append = True
-        for subcat in get_subcatlist(host, cat['id']):
-            if subcat['id'] not in subcat_ids:
-                append = False
-                break
-        if append:
-            cat_ids.append(cat['id'])
+        if all(subcat_id in selected
+               for subcat_id in index['children'][cat_id]):
+            cat_ids.append(cat_id)
 
     # Удаление из списка подкатегорий, сформировавших категорию верхнего уровня
+    covered = set()
     for cat_id in cat_ids:
-        for subcat in get_subcatlist(host, cat_id):
-            index = -1
-            for i, subcat_id in enumerate(subcat_ids):
-                if subcat_id == subcat['id']:
-                    index = i
-                    break
-            if index > -1:
-                del subcat_ids[index]
+        covered.update(index['children'].get(cat_id, ()))
+    subcat_ids = [subcat_id for subcat_id in subcategory_ids
+                  if subcat_id not in covered]
 
     return (cat_ids, subcat_ids)
 
@@ -407,6 +952,32 @@ def get_jobs_fl_ru(category_ids: list=[], subcategory_ids: list=[],
         ... ... ...
     ]
     """
+    return parse_jobs_fl_ru(get_html(**get_request_fl_ru(
+        category_ids, subcategory_ids, keywords)))
+
+# Асинхронная версия get_jobs_fl_ru()
+async def get_jobs_fl_ru_async(category_ids: list=[], subcategory_ids: list=[],
+                               keywords: str='', max_pages: int=1,
+                               seen_jobs=()) -> list:
+    """Входные параметры - см. get_jobs_fl_ru(); дополнительно:
+    max_pages: int - максимальное число страниц списка проектов (см.
+    _crawl_jobs_async()), но не более CRAWL_MAX_PAGES_FL_RU;
+    seen_jobs - множества проектов, просмотренных получателями ленты (см.
+    _crawl_jobs_async()).
+    """
+    return await _crawl_jobs_async(
+        get_request_fl_ru(category_ids, subcategory_ids, keywords),
+        parse_jobs_fl_ru, iter_jobs_fl_ru, LISTING_BOUNDS['fl_ru'],
+        min(max_pages, CRAWL_MAX_PAGES_FL_RU), seen_jobs)
+
+# Сформировать параметры http-запроса списка проектов сайта FL.ru
+def get_request_fl_ru(category_ids: list=[], subcategory_ids: list=[],
+                      keywords: str='') -> dict:
+    """Входные параметры - см. get_jobs_fl_ru().
+
+    Возвращаемое значение:
+    словарь с параметрами url и data для get_html() и get_html_async().
+    """
     payload = {
         'action': 'postfilter',
         'kind': '5',
@@ -423,54 +994,174 @@ def get_jobs_fl_ru(category_ids: list=[], subcategory_ids: list=[],
     if keywords:
         payload['pf_keywords'] = keywords
 
-    html = get_html(URL_JOBS_FL_RU, data=payload)
-    if html:
-        jobs = []
-        soup = BeautifulSoup(html, 'html.parser')
-        posts = soup.find_all('div', class_='b-post') or []
-        for post in posts:
-            job = {}
-
-            if post.find('h2', class_='b-post__pin'):
-                job['pinned'] = True
-
-            title = post.find('a', class_='b-post__link')
-            if title:
-                job['title'] = title.get_text(strip=True)
-                job['url'] = HOST_FL_RU + title.get('href', '')
+    return {'url': URL_JOBS_FL_RU, 'data': payload}
+
+# Получить функцию проверки атрибута class элемента на наличие класса
+# class_name. В отличие от простого сравнения строк, она работает для любого
+# движка разбора и любого числа классов у элемента
+def _has_class(class_name: str):
+    def check(value) -> bool:
+        if not value:
+            return False
+        if isinstance(value, str):
+            value = value.split()
+        return class_name in value
+    return check
+
+# Фильтры элементов страниц со списками проектов (см. _make_soup())
+STRAINER_FL_RU = SoupStrainer('div', class_=_has_class('b-post'))
+STRAINER_FL_UA = SoupStrainer('ul', class_=_has_class('l-projectList'))
+STRAINER_ITEM_FL_UA = SoupStrainer('li')
+
+# Построить дерево разбора только для нужной части web-страницы
+def _make_soup(html: str, strainer: SoupStrainer,
+               backend: str=None) -> BeautifulSoup:
+    """Входные параметры:
+    html: str - текстовый контент web-страницы;
+    strainer: SoupStrainer - фильтр элементов, для которых строится дерево
+    (остальная часть страницы пропускается);
+    backend: str - движок разбора HTML (по умолчанию PARSER_BACKEND).
+    """
+    return BeautifulSoup(html, backend or PARSER_BACKEND, parse_only=strainer)
 
-            scripts = post.find_all('script', type='text/javascript')
-            if scripts:
-                multiscript = '\n'.join([str(script) for script in scripts])
+# Разбить фрагмент страницы со списком проектов (см. LISTING_BOUNDS) на
+# записи об отдельных проектах без построения дерева элементов
+def _split_posts(html: str, site: str) -> list:
+    """Входные параметры:
+    html: str - текстовый контент web-страницы;
+    site: str - ключ сайта в LISTING_BOUNDS ('fl_ru' или 'fl_ua').
 
-                search_results = re.findall(PRICE_RE, multiscript)
-                if search_results:
-                    job['price'] = unescape(search_results[0]).strip()
+    Возвращаемое значение:
+    [(ключ проекта (см. get_job_key()) или пустая строка, текст записи),...]
+    """
+    if not html:
+        return []
 
-                search_results = re.findall(DESCRIPTION_RE, multiscript)
-                if search_results:
-                    job['description'] = unescape(search_results[0]).strip()
+    begin_marker, end_marker = LISTING_BOUNDS[site]
+    begin = html.find(begin_marker)
+    if begin < 0:
+        return []
+    begin = max(html.rfind('<', 0, begin), 0)
+    end = html.find(end_marker, begin)
+    if end < 0:
+        end = len(html)
+
+    if site == 'fl_ru':
+        starts = [match.start()
+                  for match in POST_RE_FL_RU.finditer(html, begin, end)]
+    else:
+        # Запись о проекте - элемент списка, содержащий заголовок проекта
+        starts = []
+        for match in POST_TITLE_RE_FL_UA.finditer(html, begin, end):
+            start = html.rfind('<li', begin, match.start())
+            if start >= 0 and (not starts or start > starts[-1]):
+                starts.append(start)
+
+    posts = []
+    for start, stop in zip(starts, starts[1:] + [end]):
+        chunk = html[start:stop]
+        match = JOB_ID_RE.search(chunk)
+        posts.append((str(int(match.group(1))) if match else '', chunk))
+    return posts
+
+# Разобрать запись об одном проекте со страницы FL.ru
+def _parse_post_fl_ru(post) -> dict:
+    job = {}
+
+    if post.find('h2', class_='b-post__pin'):
+        job['pinned'] = True
+
+    title = post.find('a', class_='b-post__link')
+    if title:
+        job['title'] = title.get_text(strip=True)
+        job['url'] = HOST_FL_RU + title.get('href', '')
+
+    scripts = post.find_all('script', type='text/javascript')
+    if scripts:
+        multiscript = '\n'.join([str(script) for script in scripts])
+
+        search_results = re.findall(PRICE_RE, multiscript)
+        if search_results:
+            job['price'] = unescape(search_results[0]).strip()
+
+        search_results = re.findall(DESCRIPTION_RE, multiscript)
+        if search_results:
+            job['description'] = unescape(search_results[0]).strip()
+
+    return job
+
+# Разобрать страницу со списком проектов сайта FL.ru
+def parse_jobs_fl_ru(html: str, backend: str=None) -> list:
+    """Входные параметры:
+    html: str - текстовый контент web-страницы;
+    backend: str - движок разбора HTML (см. _make_soup()).
 
-            jobs.append(job)
-        return jobs
+    Возвращаемый результат - см. get_jobs_fl_ru().
+    """
+    if html:
+        soup = _make_soup(html, STRAINER_FL_RU, backend)
+        posts = soup.find_all('div', class_='b-post') or []
+        return [_parse_post_fl_ru(post) for post in posts]
     else:
         return []
 
+# Разобрать страницу со списком проектов сайта FL.ru, выдавая проекты по
+# одному по мере разбора
+def iter_jobs_fl_ru(html: str, backend: str=None, known_jobs: dict=None):
+    """Входные параметры:
+    html, backend - см. parse_jobs_fl_ru();
+    known_jobs: dict - уже разобранные ранее проекты по ключам (см.
+    get_job_key()); такие проекты выдаются без повторного разбора.
+
+    Возвращаемое значение:
+    генератор проектов (структура проекта - см. get_jobs_fl_ru()). Каждая
+    запись о проекте разбирается только тогда, когда запрошен следующий
+    проект, поэтому при досрочном прекращении перебора (например, на уже
+    известном проекте) остальные записи не разбираются. Разбор всей страницы
+    таким способом медленнее, чем parse_jobs_fl_ru().
+    """
+    for job_key, chunk in _split_posts(html, 'fl_ru'):
+        if known_jobs and job_key in known_jobs:
+            yield known_jobs[job_key]
+            continue
+
+        post = _make_soup(chunk, STRAINER_FL_RU, backend).find(
+            'div', class_='b-post')
+        if post:
+            yield _parse_post_fl_ru(post)
+
 # Получить строку с ключевыми словами для заданной уникальным идентификатором
 # подкатегории (актуально только для Freelance.ua)
 def get_keyword(subcategory_id: str) -> str:
-    for cat in categories_fl_ua:
-        for subcat in cat['children']:
-            if subcategory_id == subcat['id']:
-                return subcat['keyword']
-
-    return False
+    return get_cat_index(HOST_FL_UA)['keywords'].get(subcategory_id, False)
 
 # Получить список новых проектов с сайта Freelance.ua
 def get_jobs_fl_ua(category_ids: list=[], subcategory_ids: list=[],
                    keywords: str='') -> list:
     """Входные параметры и возвращаемый результат - см. get_jobs_fl_ru().
     """
+    return parse_jobs_fl_ua(get_html(**get_request_fl_ua(
+        category_ids, subcategory_ids, keywords)))
+
+# Асинхронная версия get_jobs_fl_ua()
+async def get_jobs_fl_ua_async(category_ids: list=[], subcategory_ids: list=[],
+                               keywords: str='', max_pages: int=1,
+                               seen_jobs=()) -> list:
+    """Входные параметры - см. get_jobs_fl_ru_async().
+    """
+    return await _crawl_jobs_async(
+        get_request_fl_ua(category_ids, subcategory_ids, keywords),
+        parse_jobs_fl_ua, iter_jobs_fl_ua, LISTING_BOUNDS['fl_ua'], max_pages,
+        seen_jobs)
+
+# Сформировать параметры http-запроса списка проектов сайта Freelance.ua
+def get_request_fl_ua(category_ids: list=[], subcategory_ids: list=[],
+                      keywords: str='') -> dict:
+    """Входные параметры - см. get_jobs_fl_ru().
+
+    Возвращаемое значение:
+    словарь с параметрами url и params для get_html() и get_html_async().
+    """
     params = {
         'page': '1',
         'pc': '1',
@@ -489,47 +1180,69 @@ def get_jobs_fl_ua(category_ids: list=[], subcategory_ids: list=[],
         if subcat_keywords:
             params['orders'] = ','.join(subcat_keywords)
 
-    html = get_html(URL_JOBS_FL_UA, params=params)
+    return {'url': URL_JOBS_FL_UA, 'params': params}
+
+# Разобрать запись об одном проекте со страницы Freelance.ua
+def _parse_item_fl_ua(item) -> dict:
+    job = {}
+
+    project_title = item.find('header', class_='l-project-title')
+    if project_title:
+        if project_title.find('i', class_='c-icon-fixed'):
+            job['pinned'] = True
+
+        title_link = project_title.findChild('a', recursive=False)
+        if title_link:
+            job['title'] = title_link.get_text().strip()
+            job['url'] = title_link.get('href', '')
+
+    project_head = item.find('div', class_='l-project-head')
+    if project_head:
+        price = project_head.findChild('span', recursive=False)
+        if price:
+            job['price'] = price.get_text().strip()
+
+    article = item.find('article')
+    if article:
+        description = article.findChild('p', recursive=False)
+        job['description'] = clean_text(description.get_text())
+
+    return job
+
+# Разобрать страницу со списком проектов сайта Freelance.ua
+def parse_jobs_fl_ua(html: str, backend: str=None) -> list:
+    """Входные параметры и возвращаемый результат - см. parse_jobs_fl_ru().
+    """
     if html:
-        jobs = []
-        soup = BeautifulSoup(html, 'html.parser')
+        soup = _make_soup(html, STRAINER_FL_UA, backend)
         root = soup.find('ul', class_='l-projectList')
         if root:
             items = root.findChildren('li', recursive=False) or []
-            for item in items:
-                job = {}
-
-                project_title = item.find('header', class_='l-project-title')
-                if project_title:
-                    if project_title.find('i', class_='c-icon-fixed'):
-                        job['pinned'] = True
-
-                    title_link = project_title.findChild('a', recursive=False)
-                    if title_link:
-                        job['title'] = title_link.get_text().strip()
-                        job['url'] = title_link.get('href', '')
-
-                project_head = item.find('div', class_='l-project-head')
-                if project_head:
-                    price = project_head.findChild('span', recursive=False)
-                    if price:
-                        job['price'] = price.get_text().strip()
-
-                article = item.find('article')
-                if article:
-                    description = article.findChild('p', recursive=False)
-                    job['description'] = clean_text(description.get_text())
-
-                jobs.append(job)
-        return jobs
+            return [_parse_item_fl_ua(item) for item in items]
+        return []
     else:
         return []
 
+# Разобрать страницу со списком проектов сайта Freelance.ua, выдавая проекты
+# по одному по мере разбора
+def iter_jobs_fl_ua(html: str, backend: str=None, known_jobs: dict=None):
+    """Входные параметры и возвращаемое значение - см. iter_jobs_fl_ru().
+    """
+    for job_key, chunk in _split_posts(html, 'fl_ua'):
+        if known_jobs and job_key in known_jobs:
+            yield known_jobs[job_key]
+            continue
+
+        item = _make_soup(chunk, STRAINER_ITEM_FL_UA, backend).find('li')
+        if item:
+            yield _parse_item_fl_ua(item)
+
 # Получить список проектов, более новых, чем указанный
 def get_recent_jobs(jobs: list, last_job_url: str) -> list:
     """Входные параметры:
     jobs: list - исходный список проектов; структура данного списка повторяет
-    возвращаемый результат функции get_jobs_fl_ru();
+    возвращаемый результат функции get_jobs_fl_ru(). Может быть и генератором
+    (см. iter_jobs()): проекты после last_job_url из него не запрашиваются;
     last_job_url - адрес web-страницы проекта, после которого (включая и его)
     другие проекты из начального списка добавляться в выходной список не будут.
     остальные параметры те же, что и у get_jobs_fl_ru().
@@ -548,6 +1261,223 @@ def get_recent_jobs(jobs: list, last_job_url: str) -> list:
         recent_jobs.append(job)
     return recent_jobs
 
+# Получить список проектов, отсутствующих среди уже просмотренных
+def get_new_jobs(jobs: list, seen_jobs) -> list:
+    """Входные параметры:
+    jobs: list - исходный список проектов; структура данного списка повторяет
+    возвращаемый результат функции get_jobs_fl_ru();
+    seen_jobs - множество (или словарь) ключей уже просмотренных проектов (см.
+    get_job_key()).
+
+    Возвращаемый результат:
+    список проектов, ключей которых нет в seen_jobs, в исходном порядке. В
+    отличие от get_recent_jobs(), результат не зависит от порядка проектов в
+    ленте и от того, остался ли в ней какой-либо конкретный проект.
+    "Прикреплённые" проекты игнорируются.
+    """
+    return [job for job in jobs
+            if not job.get('pinned', False)
+            and get_job_key(job['url']) not in seen_jobs]
+
+# Получить идентификатор категории верхнего уровня, которой принадлежит
+# подкатегория (пустая строка, если подкатегория не найдена)
+def get_parent_id(host: str, subcategory_id: str) -> str:
+    if host not in HOSTS:
+        return ''
+    return get_cat_index(host)['parents'].get(subcategory_id, '')
+
+# Получить числовой идентификатор проекта из адреса его web-страницы
+def get_job_id(url: str) -> int:
+    search_result = re.search(JOB_ID_RE, url)
+    if search_result:
+        return int(search_result.group(1))
+    return 0
+
+# Получить ключ проекта для множества просмотренных проектов: числовой
+# идентификатор проекта, а если его нет в адресе - сам адрес
+def get_job_key(url: str) -> str:
+    job_id = get_job_id(url)
+    if job_id:
+        return str(job_id)
+    return url
+
+# Получить ленту проектов одной категории (или подкатегории) сайта host
+def get_category_jobs(host: str, category_id: str) -> list:
+    """Входные параметры:
+    host: str - адрес сайта биржи фриланса;
+    category_id: str - строковый уникальный идентификатор категории верхнего
+    уровня или подкатегории.
+
+    Возвращаемый результат:
+    список проектов - аналогичен результату, возвращаемому get_jobs_fl_ru();
+    каждый проект дополнительно содержит ключ 'categories' - список
+    идентификаторов лент, в которых он был найден (здесь - [category_id]).
+    """
+    if get_parent_id(host, category_id):
+        jobs = get_jobs(host, subcategory_ids=[category_id]) or []
+    else:
+        jobs = get_jobs(host, category_ids=[category_id]) or []
+
+    return _tag_jobs(jobs, category_id)
+
+# Асинхронная версия get_category_jobs()
+async def get_category_jobs_async(host: str, category_id: str,
+                                  max_pages: int=1, seen_jobs=()) -> list:
+    """Входные параметры - см. get_category_jobs(); дополнительно:
+    max_pages, seen_jobs - см. get_jobs_async().
+    """
+    if get_parent_id(host, category_id):
+        jobs = await get_jobs_async(host, subcategory_ids=[category_id],
+                                    max_pages=max_pages,
+                                    seen_jobs=seen_jobs) or []
+    else:
+        jobs = await get_jobs_async(host, category_ids=[category_id],
+                                    max_pages=max_pages,
+                                    seen_jobs=seen_jobs) or []
+
+    return _tag_jobs(jobs, category_id)
+
+# Пометить проекты идентификатором ленты категории, из которой они получены
+def _tag_jobs(jobs: list, category_id: str) -> list:
+    for job in jobs:
+        job['categories'] = [category_id]
+    return jobs
+
+# Объединить несколько лент проектов одного сайта в одну
+def merge_jobs(job_lists: list) -> list:
+    """Входной параметр:
+    job_lists: list - список лент проектов (см. get_category_jobs()).
+
+    Возвращаемый результат:
+    единый список проектов без повторов, упорядоченный от новых к старым;
+    для повторяющихся проектов списки 'categories' объединяются.
+    """
+    merged = {}
+    for jobs in job_lists:
+        for job in jobs:
+            url = job.get('url')
+            if not url:
+                continue
+            if url in merged:
+                for category_id in job.get('categories', []):
+                    if category_id not in merged[url]['categories']:
+                        merged[url]['categories'].append(category_id)
+            else:
+                merged[url] = dict(job)
+                merged[url]['categories'] = list(job.get('categories', []))
+
+    return sorted(merged.values(), key=lambda job: get_job_id(job['url']),
+                  reverse=True)
+
+# Получить номер бита категории или подкатегории сайта host
+def _get_cat_bit(host: str, cat_id: str) -> int:
+    bits = get_cat_index(host)['bits']
+    bit = bits.get(cat_id)
+    if bit is None:
+        extra_bits = _extra_bits.setdefault(host, {})
+        bit = extra_bits.setdefault(cat_id, len(bits) + len(extra_bits))
+    return bit
+
+# Получить битовую маску набора лент (категорий и подкатегорий) сайта host
+def get_feed_mask(host: str, feed_ids) -> int:
+    bits = get_cat_index(host)['bits']
+    mask = 0
+    for feed_id in feed_ids:
+        bit = bits.get(feed_id)
+        if bit is None:
+            bit = _get_cat_bit(host, feed_id)
+        mask |= 1 << bit
+    return mask
+
+# Получить битовую маску фильтра по категориям: биты выбранных категорий и
+# подкатегорий, а также всех подкатегорий выбранных категорий
+def get_cat_mask(host: str, category_ids, subcategory_ids) -> int:
+    masks = get_cat_index(host)['masks']
+    mask = get_feed_mask(host, subcategory_ids)
+    for category_id in category_ids:
+        category_mask = masks.get(category_id)
+        if category_mask is None:
+            category_mask = get_feed_mask(host, (category_id,))
+        mask |= category_mask
+    return mask
+
+# Таблица преобразования двоичной записи числа в последовательность байтов
+# 0 и 1 (см. _select_by_mask())
+_BIT_TABLE = bytes.maketrans(b'01', b'\x00\x01')
+
+# Перечислить номера установленных битов маски (по возрастанию). Поиск
+# по двоичной записи числа работает быстро и для очень длинных масок
+def _iter_bits(mask: int):
+    binary = bin(mask)[:1:-1]
+    bit = binary.find('1')
+    while bit >= 0:
+        yield bit
+        bit = binary.find('1', bit + 1)
+
+# Отобрать элементы списка, номера которых соответствуют установленным битам
+# маски. Плотные маски обрабатываются встроенными функциями целиком, а для
+# разреженных перебираются только установленные биты
+def _select_by_mask(items: list, mask: int) -> list:
+    binary = bin(mask)[:1:-1]
+    if binary.count('1') * 8 > len(binary):
+        return list(compress(items, binary.encode().translate(_BIT_TABLE)))
+
+    selected = []
+    index = binary.find('1')
+    while index >= 0:
+        selected.append(items[index])
+        index = binary.find('1', index + 1)
+    return selected
+
+# Распределить проекты общей ленты сразу по многим фильтрам по категориям
+def route_jobs_bulk(host: str, jobs: list, cat_filters: list) -> list:
+    """Входные параметры:
+    host: str - адрес сайта биржи фриланса;
+    jobs: list - список проектов с ключом 'categories' (см. merge_jobs());
+    cat_filters: list - список фильтров вида (category_ids, subcategory_ids)
+    (см. get_jobs_fl_ru()).
+
+    Возвращаемое значение:
+    список той же длины, что и cat_filters: для каждого фильтра - проекты,
+    подпадающие под него, в исходном порядке.
+
+    Проект подпадает под фильтр, если хотя бы одна из его лент совпадает с
+    выбранной категорией или подкатегорией либо является подкатегорией
+    выбранной категории. Фильтры и ленты проектов кодируются битовыми масками
+    (см. get_cat_mask()). Для каждой ленты строится маска проектов, в которых
+    она встречается (бит i - проект i), и проекты фильтра находятся
+    объединением масок его лент, без перебора проектов и их лент.
+    """
+    jobs_by_bit = {}
+    for job_index, job in enumerate(jobs):
+        job_bit = 1 << job_index
+        for bit in _iter_bits(get_feed_mask(host, job.get('categories', []))):
+            jobs_by_bit[bit] = jobs_by_bit.get(bit, 0) | job_bit
+
+    routed = []
+    for category_ids, subcategory_ids in cat_filters:
+        matched = 0
+        for bit in _iter_bits(get_cat_mask(host, category_ids,
+                                           subcategory_ids)):
+            matched |= jobs_by_bit.get(bit, 0)
+
+        routed.append(_select_by_mask(jobs, matched))
+
+    return routed
+
+# Отобрать из общей ленты проекты, подпадающие под фильтр по категориям
+def route_jobs(host: str, jobs: list, category_ids: list,
+               subcategory_ids: list) -> list:
+    """Входные параметры:
+    host: str - адрес сайта биржи фриланса;
+    jobs: list - список проектов с ключом 'categories' (см. merge_jobs());
+    category_ids, subcategory_ids: list - фильтр по категориям (см.
+    get_jobs_fl_ru()).
+
+    Правило отбора - см. route_jobs_bulk(). Порядок проектов сохраняется.
+    """
+    return route_jobs_bulk(host, jobs, [(category_ids, subcategory_ids)])[0]
+
 # Получить список новых проектов с сайта заданной биржи фриланса
 def get_jobs(host: str, category_ids: list=[], subcategory_ids: list=[],
              keywords: str='') -> list:
@@ -565,13 +1495,217 @@ def get_jobs(host: str, category_ids: list=[], subcategory_ids: list=[],
     else:
         return False
 
-# Динамически построить структуры категорий проектов для бирж фриланса. Это
-# необходимо для дальнейшего получения новых проектов с сайтов
-def init():
-    if build_catlist_fl_ru() and build_catlist_fl_ua():
-        logging.info('Структура категорий построена.')
+# Получить параметры запроса списка проектов сайта host и функцию
+# постепенного разбора страницы (None, если сайт не поддерживается)
+def _get_iter_request(host: str, category_ids: list, subcategory_ids: list,
+                      keywords: str) -> tuple:
+    if host == HOST_FL_RU:
+        return (get_request_fl_ru(category_ids, subcategory_ids, keywords),
+                iter_jobs_fl_ru)
+    elif host == HOST_FL_UA:
+        return (get_request_fl_ua(category_ids, subcategory_ids, keywords),
+                iter_jobs_fl_ua)
+    else:
+        return (None, None)
+
+# Перебрать новые проекты с сайта заданной биржи фриланса по одному
+def iter_jobs(host: str, category_ids: list=[], subcategory_ids: list=[],
+              keywords: str=''):
+    """Входные параметры - см. get_jobs().
+
+    Возвращаемое значение:
+    генератор проектов первой страницы списка (структура проекта - см.
+    get_jobs_fl_ru()). Страница загружается при запросе первого проекта, а
+    каждая запись о проекте разбирается только при запросе этого проекта.
+    Перебор можно прекратить на первом известном проекте, например:
+    get_recent_jobs(iter_jobs(host, ...), last_job_url).
+    """
+    request, iter_func = _get_iter_request(host, category_ids,
+                                           subcategory_ids, keywords)
+    if request is not None:
+        yield from iter_func(get_html(**request))
+
+# Асинхронная версия iter_jobs()
+async def iter_jobs_async(host: str, category_ids: list=[],
+                          subcategory_ids: list=[], keywords: str=''):
+    """Возвращаемое значение:
+    асинхронный генератор проектов (см. iter_jobs()). Страница загружается
+    асинхронно, разбор записей выполняется по одной при каждом запросе.
+    """
+    request, iter_func = _get_iter_request(host, category_ids,
+                                           subcategory_ids, keywords)
+    if request is not None:
+        for job in iter_func(await get_html_async(**request)):
+            yield job
+
+# Кеш результатов get_jobs_async(): ключ запроса -> (время устаревания,
+# список проектов); упорядочен по давности использования
+_jobs_cache = OrderedDict()
+
+# Выполняемые в данный момент запросы get_jobs_async() по ключам запросов
+_jobs_inflight = {}
+
+# Сформировать нормализованный ключ запроса списка проектов
+def _get_jobs_key(host: str, category_ids: list, subcategory_ids: list,
+                  keywords: str, max_pages: int, seen_jobs) -> tuple:
+    keywords = sorted(set(keyword.strip() for keyword
+                          in keywords.lower().split(',') if keyword.strip()))
+    # Множества просмотренных проектов определяют глубину обхода, поэтому
+    # входят в ключ, если обходится больше одной страницы
+    if max_pages > 1:
+        seen_jobs = frozenset(frozenset(seen) for seen in seen_jobs if seen)
+    else:
+        seen_jobs = frozenset()
+    return (host, tuple(sorted(set(category_ids))),
+            tuple(sorted(set(subcategory_ids))), ','.join(keywords),
+            max_pages, seen_jobs)
+
+# Сохранить результат завершённого запроса в кеш
+def _store_jobs(key: tuple, task: asyncio.Future):
+    _jobs_inflight.pop(key, None)
+
+    if task.cancelled() or task.exception() is not None:
+        return
+
+    jobs = task.result()
+    if jobs is False:
+        return
+
+    _jobs_cache[key] = (time.monotonic() + JOBS_CACHE_TTL, jobs)
+    _jobs_cache.move_to_end(key)
+    while len(_jobs_cache) > JOBS_CACHE_SIZE:
+        _jobs_cache.popitem(last=False)
+
+# Асинхронная версия get_jobs()
+async def get_jobs_async(host: str, category_ids: list=[],
+                         subcategory_ids: list=[], keywords: str='',
+                         max_pages: int=1, seen_jobs=()) -> list:
+    """Входные параметры и возвращаемый результат - см. get_jobs();
+    дополнительно:
+    max_pages: int - максимальное число страниц списка проектов, которые
+    обходятся до уже просмотренных проектов (см. _crawl_jobs_async());
+    seen_jobs - последовательность множеств (или словарей) ключей проектов,
+    просмотренных каждым из получателей ленты (см. _crawl_jobs_async()).
+
+    Результаты кешируются на JOBS_CACHE_TTL секунд. Одновременные вызовы с
+    одинаковыми (после нормализации) параметрами объединяются в один запрос
+    к бирже фриланса.
+    """
+    key = _get_jobs_key(host, category_ids, subcategory_ids, keywords,
+                        max_pages, seen_jobs)
+
+    entry = _jobs_cache.get(key)
+    if entry:
+        if entry[0] > time.monotonic():
+            _jobs_cache.move_to_end(key)
+            return list(entry[1])
+        del _jobs_cache[key]
+
+    task = _jobs_inflight.get(key)
+    if task is None:
+        (host, category_ids, subcategory_ids, keywords, max_pages,
+         seen_jobs) = key
+        task = asyncio.ensure_future(_get_jobs_uncached_async(
+            host, list(category_ids), list(subcategory_ids), keywords,
+            max_pages, seen_jobs))
+        _jobs_inflight[key] = task
+        task.add_done_callback(lambda task: _store_jobs(key, task))
+
+    # Отмена одного из ожидающих не должна прерывать общий запрос
+    jobs = await asyncio.shield(task)
+    return list(jobs) if jobs is not False else False
+
+# Получить список проектов с сайта биржи фриланса в обход кеша
+async def _get_jobs_uncached_async(host: str, category_ids: list,
+                                   subcategory_ids: list, keywords: str,
+                                   max_pages: int, seen_jobs) -> list:
+    if host == HOST_FL_RU:
+        return await get_jobs_fl_ru_async(category_ids, subcategory_ids,
+                                          keywords, max_pages, seen_jobs)
+    elif host == HOST_FL_UA:
+        return await get_jobs_fl_ua_async(category_ids, subcategory_ids,
+                                          keywords, max_pages, seen_jobs)
+    else:
+        return False
+
+# Сохранить деревья категорий всех сайтов в файл снимка
+def save_cat_snapshot(file_name: str=CAT_SNAPSHOT_NAME) -> bool:
+    """Снимок записывается во временный файл, который затем атомарно заменяет
+    прежний, поэтому при сбое во время записи прежний снимок не повреждается.
+    Снимок не сохраняется, если дерево категорий хотя бы одного сайта пусто.
+    """
+    trees = {host: _get_cat_tree(host) for host in HOSTS}
+    if not all(trees.values()):
+        return False
+
+    snapshot = {
+        'version': CAT_SNAPSHOT_VERSION,
+        'saved_at': int(time.time()),
+        'categories': trees,
+    }
+    temp_name = f'{file_name}.tmp'
+    try:
+        with open(temp_name, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(temp_name, file_name)
+    except OSError as e:
+        logging.error(f'Не удалось сохранить снимок категорий: {e}')
+        return False
+    return True
+
+# Проверить структуру дерева категорий, прочитанного из снимка
+def _is_valid_cat_tree(categories) -> bool:
+    if not isinstance(categories, list) or not categories:
+        return False
+    for cat in categories:
+        if (not isinstance(cat, dict)
+                or not isinstance(cat.get('id'), str)
+                or not isinstance(cat.get('title'), str)
+                or not isinstance(cat.get('children'), list)):
+            return False
+        for subcat in cat['children']:
+            if (not isinstance(subcat, dict)
+                    or not isinstance(subcat.get('id'), str)
+                    or not isinstance(subcat.get('title'), str)):
+                return False
+    return True
+
+# Загрузить деревья категорий всех сайтов из файла снимка
+def load_cat_snapshot(file_name: str=CAT_SNAPSHOT_NAME) -> bool:
+    """Возвращаемое значение:
+    True, если снимок нужной версии прочитан и деревья категорий всех сайтов
+    заменены деревьями из снимка; иначе False (текущие деревья не меняются).
+    """
+    try:
+        with open(file_name, encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError) as e:
+        logging.warning(f'Не удалось прочитать снимок категорий: {e}')
+        return False
+
+    if (not isinstance(snapshot, dict)
+            or snapshot.get('version') != CAT_SNAPSHOT_VERSION
+            or not isinstance(snapshot.get('categories'), dict)):
+        logging.warning('Снимок категорий имеет неизвестный формат.')
+        return False
+
+    trees = snapshot['categories']
+    if not all(_is_valid_cat_tree(trees.get(host)) for host in HOSTS):
+        logging.warning('Снимок категорий повреждён или неполон.')
+        return False
 
-    # Проверка фактической наполненности дерева категорий
+    for host in HOSTS:
+        set_cat_tree(host, trees[host])
+
+    saved_at = time.strftime('%d.%m.%Y %H:%M:%S',
+                             time.localtime(snapshot.get('saved_at', 0)))
+    logging.info(f'Структура категорий загружена из снимка от {saved_at}.')
+    return True
+
+# Проверить фактическую наполненность дерева категорий
+def _check_catlists():
     for host in HOSTS:
         catlist = get_catlist(host)
         if catlist:
@@ -581,3 +1715,69 @@ def init():
                                     'не содержит подкатегорий!')
         else:
             logging.warning(f'Список категорий сайта {host} пуст!')
+
+# Заново построить структуры категорий по данным бирж фриланса и обновить
+# снимок. Дерево каждого сайта заменяется целиком (см. set_cat_tree()), только
+# если его удалось построить
+async def refresh_catlists_async() -> bool:
+    results = await asyncio.gather(build_catlist_fl_ru_async(),
+                                   build_catlist_fl_ua_async())
+    if not any(results):
+        return False
+
+    logging.info('Структура категорий обновлена.')
+    _check_catlists()
+    save_cat_snapshot()
+    return all(results)
+
+# Периодически обновлять структуры категорий (каждые CATLIST_REFRESH_PERIOD
+# секунд). Пока деревья категорий не построены для всех сайтов, попытки
+# повторяются чаще: через CATLIST_RETRY_PERIOD секунд с удвоением паузы
+async def refresh_catlists_task(refresh_now: bool=False):
+    """Входной параметр:
+    refresh_now: bool - обновить структуры категорий сразу при запуске, а не
+    по истечении первого периода (см. значение, возвращаемое init()).
+    """
+    retry_period = CATLIST_RETRY_PERIOD
+    if not refresh_now:
+        await asyncio.sleep(CATLIST_REFRESH_PERIOD)
+
+    while True:
+        try:
+            refreshed = await refresh_catlists_async()
+        except Exception as e:
+            logging.error(e)
+            refreshed = False
+
+        if refreshed:
+            retry_period = CATLIST_RETRY_PERIOD
+            await asyncio.sleep(CATLIST_REFRESH_PERIOD)
+        else:
+            logging.warning('Структура категорий не обновлена, повторная '
+                            f'попытка через {retry_period} с.')
+            await asyncio.sleep(retry_period)
+            retry_period = min(retry_period * 2, CATLIST_REFRESH_PERIOD)
+
+# Динамически построить структуры категорий проектов для бирж фриланса. Это
+# необходимо для дальнейшего получения новых проектов с сайтов
+def init() -> bool:
+    """Если есть снимок деревьев категорий (см. load_cat_snapshot()), то они
+    загружаются из него без обращения к биржам, а актуализируются позже в фоне
+    (см. refresh_catlists_task()).
+
+    Возвращаемое значение:
+    True, если структуры категорий нужно обновить сразу: деревья загружены из
+    снимка или дерево хотя бы одного сайта построить не удалось; False, если
+    деревья всех сайтов построены по данным бирж.
+    """
+    if load_cat_snapshot():
+        _check_catlists()
+        return True
+
+    results = [build_catlist_fl_ru(), build_catlist_fl_ua()]
+    if all(results):
+        logging.info('Структура категорий построена.')
+        save_cat_snapshot()
+
+    _check_catlists()
+    return not all(results)
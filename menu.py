@@ -8,8 +8,8 @@ import fl_parser
 import database
 
 # Начальное (корневое) меню
-def get_root(user_id: str) -> InlineKeyboardMarkup:
-    settings = database.get_settings(user_id) or {}
+async def get_root(user_id: str) -> InlineKeyboardMarkup:
+    settings = await database.get_settings_async(user_id) or {}
 
     markup = InlineKeyboardMarkup()
 
@@ -102,9 +102,11 @@ def get_select_host() -> InlineKeyboardMarkup:
     )
 
 # Меню выбора типа фильтра проектов (ключевые слова или категории)
-def get_select_filter_type(user_id: str, host: str) -> InlineKeyboardMarkup:
+async def get_select_filter_type(user_id: str,
+                                 host: str) -> InlineKeyboardMarkup:
     sel_cat = sel_kw = ''
-    job_filters = database.get_filters(user_id=user_id, host=host) or []
+    job_filters = await database.get_filters_async(user_id=user_id,
+                                                   host=host) or []
     for job_filter in job_filters:
         if job_filter.get('keywords'):
             sel_kw = f'{EMO_CHECK_MARK} '
@@ -132,9 +134,9 @@ def get_select_filter_type(user_id: str, host: str) -> InlineKeyboardMarkup:
     )
 
 # Получить категории и подкатегории соответствующего фильтра проектов
-def _get_cat_filter(user_id: str, host: str) -> tuple:
-    job_filters = database.get_filters(user_id=user_id, host=host,
-                                       query='categories') or []
+async def _get_cat_filter(user_id: str, host: str) -> tuple:
+    job_filters = await database.get_filters_async(user_id=user_id, host=host,
+                                                   query='categories') or []
     if len(job_filters) > 0:
         categories = job_filters[0].get('categories', [])
         subcategories = job_filters[0].get('subcategories', [])
@@ -145,8 +147,14 @@ def _get_cat_filter(user_id: str, host: str) -> tuple:
     return (categories, subcategories)
 
 # Меню выбора категории проектов для фильтрации
-def get_select_category(user_id: str, host: str) -> InlineKeyboardMarkup:
-    categories, subcategories = _get_cat_filter(user_id=user_id, host=host)
+async def get_select_category(user_id: str,
+                              host: str) -> InlineKeyboardMarkup:
+    categories, subcategories = await _get_cat_filter(user_id=user_id,
+                                                      host=host)
+
+    # Категории, в которых выбрана хотя бы одна подкатегория
+    partial = {fl_parser.get_parent_id(host, subcat_id)
+               for subcat_id in subcategories}
 
     markup = InlineKeyboardMarkup()
 
@@ -166,11 +174,8 @@ def get_select_category(user_id: str, host: str) -> InlineKeyboardMarkup:
 
             if cat['id'] in categories:
                 title = f'{EMO_CHECK_MARK}{EMO_CHECK_MARK} {title}'
-            else:
-                for subcat_id in subcategories:
-                    if fl_parser.is_category_child(host, cat['id'], subcat_id):
-                        title = f'{EMO_CHECK_MARK} {title}'
-                        break
+            elif cat['id'] in partial:
+                title = f'{EMO_CHECK_MARK} {title}'
 
             row.append(InlineKeyboardButton(text=title,
                                             callback_data=cat['id']))
@@ -182,15 +187,18 @@ def get_select_category(user_id: str, host: str) -> InlineKeyboardMarkup:
     return markup
 
 # Меню выбора подкатегорий проектов для фильтрации
-def get_select_subcategory(user_id: str, host: str,
-                           category_id: str) -> InlineKeyboardMarkup:
-    categories, subcategories = _get_cat_filter(user_id=user_id, host=host)
+async def get_select_subcategory(user_id: str, host: str,
+                                 category_id: str) -> InlineKeyboardMarkup:
+    categories, subcategories = await _get_cat_filter(user_id=user_id,
+                                                      host=host)
 
     if category_id in categories:
         selected = True
     else:
         selected = False
 
+    subcategories = set(subcategories)
+
     markup = InlineKeyboardMarkup()
     markup.row(InlineKeyboardButton(
         text=f'{EMO_CHECK_MARK}{EMO_CHECK_MARK} Выбрать всё',
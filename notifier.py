@@ -5,12 +5,10 @@ import sys
 import logging
 import asyncio
 import time
-import smtplib
-import ssl
+from functools import partial
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from html import escape
-from random import randint
 
 from aiogram import Bot
 from aiogram.types import Message, ParseMode
@@ -18,17 +16,43 @@ from aiogram.types import Message, ParseMode
 from emoticons import *
 import fl_parser
 import database
+from delivery import TelegramQueue, EmailSender
 from config import (NOTIFY_PERIOD, SHUTDOWN_PERIOD, SMTP_PORT, SMTP_SERVER,
                     BOT_EMAIL, BOT_PASSWORD)
 
-# Минимальное и максимальное значение задержки после получения данных от
-# сервера биржи фриланса (секунды). Используется во избежание 'бана'
-REQUEST_DELAY_MIN = 2
-REQUEST_DELAY_MAX = 10
-
 # Максимальное количество новых проектов в одном сообщении
 MAX_JOB_COUNT = 10
 
+# Режим получения проектов по категориям: если True, то лента каждой выбранной
+# кем-либо категории (подкатегории) загружается за цикл рассылки один раз,
+# а проекты распределяются по фильтрам пользователей локально. Число запросов
+# к бирже в этом режиме ограничено размером дерева категорий
+CATEGORY_INGESTION = False
+
+# Максимальное число страниц списка проектов, обходимых по одному запросу до
+# проектов, уже просмотренных каждым фильтром с этим запросом; больше одной
+# страницы запрашивается, только если новые проекты не уместились на первой (например, при всплеске
+# публикаций между циклами рассылки). Для FL.ru число страниц дополнительно
+# ограничено fl_parser.CRAWL_MAX_PAGES_FL_RU
+CRAWL_MAX_PAGES = 5
+
+# Максимальное число пользователей, обрабатываемых одновременно в цикле
+# рассылки (запросы к биржам фриланса дополнительно ограничены в fl_parser)
+NOTIFY_CONCURRENCY = 20
+
+# Максимальное число проектов в множестве просмотренных проектов фильтра и
+# время (в секундах), по истечении которого проект, исчезнувший из ленты,
+# удаляется из этого множества
+SEEN_JOBS_SIZE = 200
+SEEN_JOBS_TTL = 60 * 60 * 24 * 7
+
+# Очередь исходящих сообщений Telegram (создаётся при первой отправке)
+telegram_queue = None
+
+# Отправитель e-mail с постоянным SMTP-соединением (создаётся при первой
+# отправке)
+email_sender = None
+
 HTML_BEGIN = """\
 <!doctype html>
 <html lang="ru">
@@ -60,135 +84,459 @@ async def notify_users_task(bot: Bot):
         except Exception as e:
             logging.error(e)
 
+        for host, stats in fl_parser.get_rate_stats().items():
+            logging.info(f'Запросы к {host}: {stats["requests"]}, из них '
+                         f'с ожиданием {stats["delayed"]}; суммарное ожидание '
+                         f'{stats["wait_total"]:.1f} с, максимальное '
+                         f'{stats["wait_max"]:.1f} с.')
+
+        if telegram_queue is not None:
+            stats = telegram_queue.get_stats()
+            logging.info(f'Очередь Telegram: {stats["depth"]} в ожидании, '
+                         f'отправлено {stats["sent"]}, сбоев '
+                         f'{stats["failed"]}, повторов {stats["retried"]}; '
+                         f'задержка средняя {stats["latency_avg"]:.1f} с, '
+                         f'максимальная {stats["latency_max"]:.1f} с.')
+
         if SHUTDOWN_PERIOD and time.monotonic() - start_time > SHUTDOWN_PERIOD:
             logging.info('Плановое завершение работы.')
             sys.exit()
 
+# Сформировать канонический ключ запроса к бирже фриланса для фильтра
+# проектов. Фильтры с одинаковым ключом дают одинаковый список проектов
+def _get_fetch_key(host: str, job_filter: database.FilterRecord) -> tuple:
+    return (host,
+            tuple(sorted(job_filter.categories)),
+            tuple(sorted(job_filter.subcategories)),
+            job_filter.keywords)
+
+# Получить список ключей запросов, необходимых для фильтра проектов
+def _get_fetch_keys(host: str, job_filter: database.FilterRecord) -> list:
+    if CATEGORY_INGESTION and not job_filter.keywords:
+        return ([(host, (category_id,), (), '')
+                 for category_id in job_filter.categories]
+                + [(host, (), (subcategory_id,), '')
+                   for subcategory_id in job_filter.subcategories])
+    else:
+        return [_get_fetch_key(host, job_filter)]
+
+# Составить план запросов к биржам фриланса на текущий цикл рассылки
+async def _plan_fetches(users) -> tuple:
+    """Входной параметр:
+    users - асинхронная последовательность записей database.UserRecord (см.
+    database.iter_active_users_async()). В плане остаются только
+    пользователи с подходящими фильтрами.
+
+    Возвращаемое значение:
+    (subscriptions, fetch_keys), где
+    subscriptions: list - список кортежей (user, host, job_filters); здесь
+    job_filters - фильтры пользователя user для сайта host в порядке обработки
+    (сначала по ключевым словам, затем по категориям);
+    fetch_keys: dict - уникальные ключи запросов (см. _get_fetch_key() и
+    _get_fetch_keys()) со списками множеств просмотренных проектов фильтров,
+    получающих ленту по этому запросу (см. fl_parser.get_jobs_async()).
+    """
+    subscriptions = []
+    fetch_keys = {}
+
+    async for user in users:
+        for host in fl_parser.HOSTS:
+            # Фильтры уже упорядочены: сначала по ключевым словам, затем по
+            # категориям; для каждого типа используется только первый
+            host_filters = []
+            for job_filter in user.filters:
+                if job_filter.host != host:
+                    continue
+                if (host_filters and bool(host_filters[-1].keywords)
+                        == bool(job_filter.keywords)):
+                    continue
+
+                host_filters.append(job_filter)
+                for fetch_key in _get_fetch_keys(host, job_filter):
+                    fetch_keys.setdefault(fetch_key, []).append(
+                        job_filter.seen_jobs)
+
+            if host_filters:
+                subscriptions.append((user, host, host_filters))
+
+    return (subscriptions, fetch_keys)
+
+# Выполнить запрос к бирже фриланса по ключу из плана запросов
+async def _fetch(fetch_key: tuple, seen_jobs: list) -> list:
+    host, category_ids, subcategory_ids, keywords = fetch_key
+
+    if CATEGORY_INGESTION and not keywords:
+        return await fl_parser.get_category_jobs_async(
+            host, (category_ids + subcategory_ids)[0],
+            max_pages=CRAWL_MAX_PAGES, seen_jobs=seen_jobs)
+    else:
+        return await fl_parser.get_jobs_async(
+            host=host,
+            category_ids=list(category_ids),
+            subcategory_ids=list(subcategory_ids),
+            keywords=keywords,
+            max_pages=CRAWL_MAX_PAGES,
+            seen_jobs=seen_jobs) or []
+
+# Получить ключ фильтра по категориям для распределения общей ленты
+# проектов; фильтры с одинаковым ключом получают одинаковые проекты
+def _get_route_key(job_filter: database.FilterRecord) -> tuple:
+    return (tuple(sorted(job_filter.categories)),
+            tuple(sorted(job_filter.subcategories)))
+
+# Объединить ленты категорий одного сайта в общую ленту проектов и
+# распределить её сразу по всем фильтрам по категориям этого сайта
+async def _route_category_pool(host: str, fetch_tasks: list,
+                               route_keys: list) -> dict:
+    """Возвращаемое значение:
+    dict(ключ фильтра (см. _get_route_key()) -> список проектов)
+    """
+    pool = fl_parser.merge_jobs(await asyncio.gather(*fetch_tasks))
+    return dict(zip(route_keys,
+                    fl_parser.route_jobs_bulk(host, pool, route_keys)))
+
+# Получить полный список проектов для фильтра по результатам запросов
+async def _get_filter_jobs(host: str, job_filter: database.FilterRecord,
+                           fetch_tasks: dict, pool_tasks: dict) -> list:
+    if CATEGORY_INGESTION and not job_filter.keywords:
+        return (await pool_tasks[host])[_get_route_key(job_filter)]
+    else:
+        return await fetch_tasks[_get_fetch_key(host, job_filter)]
+
+# Обновить множество просмотренных проектов фильтра по текущей ленте проектов
+def _update_seen_jobs(seen_jobs: dict, jobs: list, now: int) -> dict:
+    """Входные параметры:
+    seen_jobs: dict - просмотренные проекты (см. database.save_checkpoints());
+    jobs: list - текущая лента проектов фильтра (от новых к старым);
+    now: int - текущее время (секунды от начала эпохи).
+
+    Возвращаемое значение:
+    новый словарь просмотренных проектов: проекты ленты с временем now и
+    прежние проекты, исчезнувшие из ленты не более SEEN_JOBS_TTL секунд назад;
+    размер ограничен SEEN_JOBS_SIZE (вытесняются давно не встречавшиеся).
+    """
+    updated = {}
+    for job in jobs:
+        if not job.get('pinned', False):
+            updated[fl_parser.get_job_key(job['url'])] = now
+
+    for job_key, seen_time in sorted(seen_jobs.items(),
+                                     key=lambda item: item[1], reverse=True):
+        if len(updated) >= SEEN_JOBS_SIZE:
+            break
+        if job_key not in updated and now - seen_time < SEEN_JOBS_TTL:
+            updated[job_key] = seen_time
+
+    return updated
+
+# Отправить одному пользователю уведомления о новых проектах одного сайта
+async def _notify_subscription(bot: Bot, semaphore: asyncio.Semaphore,
+                               user: database.UserRecord, host: str,
+                               job_filters: list,
+                               fetch_tasks: dict, pool_tasks: dict,
+                               checkpoints: list, deliveries: list,
+                               telegram_sends: list) -> bool:
+    """Входные параметры:
+    bot: Bot - экземпляр бота;
+    semaphore: asyncio.Semaphore - ограничитель числа одновременно
+    обрабатываемых пользователей;
+    user, host, job_filters - элемент плана рассылки (см. _plan_fetches());
+    fetch_tasks: dict - задачи запросов к биржам фриланса по ключам запросов;
+    pool_tasks: dict - задачи распределения общих лент проектов по фильтрам
+    по категориям для каждого сайта;
+    checkpoints: list - список, в который добавляются новые значения
+    last_job_url и seen_jobs фильтров (см. database.save_checkpoints());
+    deliveries: list - список, в который добавляются записи о доставке
+    проектов пользователю по e-mail (см. database.save_deliveries());
+    telegram_sends: list - список, в который добавляются пары (future,
+    записи о доставке) для сообщений Telegram, поставленных в очередь;
+    записи о доставке сохраняются только после фактической отправки.
+
+    Возвращаемое значение - см. notify_users().
+    """
+    result = False
+
+    # Дождаться результатов запросов (вне семафора, чтобы ожидание сети не
+    # занимало места других пользователей)
+    filter_jobs = [await _get_filter_jobs(host, job_filter, fetch_tasks,
+                                          pool_tasks)
+                   for job_filter in job_filters]
+
+    now = int(time.time())
+
+    async with semaphore:
+        sent_urls = set()
+        for job_filter, all_jobs in zip(job_filters, filter_jobs):
+            # Новые проекты - разность ленты и множества просмотренных;
+            # last_job_url используется, пока это множество не заполнено
+            if job_filter.seen_jobs:
+                jobs = fl_parser.get_new_jobs(all_jobs, job_filter.seen_jobs)
+            else:
+                jobs = fl_parser.get_recent_jobs(
+                    jobs=all_jobs, last_job_url=job_filter.last_job_url)
+
+            seen_jobs = _update_seen_jobs(job_filter.seen_jobs, all_jobs, now)
+
+            # Контрольная точка записывается при появлении новых проектов,
+            # изменении множества просмотренных проектов или когда сохранённое
+            # время последней встречи проекта ленты устарело наполовину
+            stale = any(now - job_filter.seen_jobs.get(job_key, now)
+                        > SEEN_JOBS_TTL // 2
+                        for job_key, seen_time in seen_jobs.items()
+                        if seen_time == now)
+            if (jobs or stale
+                    or seen_jobs.keys() != job_filter.seen_jobs.keys()):
+                if job_filter.keywords:
+                    query = 'keywords'
+                else:
+                    query = 'categories'
+
+                checkpoints.append({
+                    'user_id': user.user_id,
+                    'host': host,
+                    'query': query,
+                    'last_job_url': (jobs[0]['url'] if jobs
+                                     else job_filter.last_job_url),
+                    'seen_jobs': seen_jobs,
+                })
+
+            if not jobs:
+                continue
+
+            # Все новые проекты отмечаются просмотренными, поэтому проекты
+            # сверх MAX_JOB_COUNT отправляются дополнительными сообщениями,
+            # если множество просмотренных проектов получено по ленте этого
+            # же фильтра (при изменении фильтра оно очищается, см.
+            # database.save_filter()). Для нового или изменённого фильтра
+            # отправляются только MAX_JOB_COUNT самых свежих проектов ленты
+            if not job_filter.seen_jobs:
+                jobs = jobs[:MAX_JOB_COUNT]
+
+            # Исключить проекты, уже отправленные пользователю по другому
+            # фильтру для того же сайта
+            jobs = [job for job in jobs if job['url'] not in sent_urls]
+            sent_urls.update(job['url'] for job in jobs)
+
+            for index in range(0, len(jobs), MAX_JOB_COUNT):
+                message_jobs = jobs[index:index + MAX_JOB_COUNT]
+                records = [{
+                    'user_id': user.user_id,
+                    'host': host,
+                    'job_key': fl_parser.get_job_key(job['url']),
+                } for job in message_jobs]
+
+                if user.active:
+                    future = await send_telegram(bot, user.user_id, host,
+                                                 message_jobs)
+                    if future is not None:
+                        telegram_sends.append((future, records))
+                        result = True
+
+                if user.email_active:
+                    if await send_jobs_email(user.email, host, message_jobs):
+                        deliveries.extend(records)
+                        result = True
+
+    return result
+
+# Сохранить записи о доставке после фактической отправки сообщения Telegram
+def _save_sent_deliveries(records: list, future: asyncio.Future):
+    if not future.cancelled() and future.result():
+        asyncio.ensure_future(database.save_deliveries_async(records))
+
+# Собрать проекты, полученные за цикл рассылки, для сохранения в базе (см.
+# database.save_jobs()); каждый проект встречается в результате один раз
+def _collect_jobs(fetch_tasks: dict) -> list:
+    job_lists = {}
+    for fetch_key, task in fetch_tasks.items():
+        if task.done() and not task.cancelled() and not task.exception():
+            if task.result():
+                job_lists.setdefault(fetch_key[0], []).append(task.result())
+
+    jobs = []
+    for host, host_job_lists in job_lists.items():
+        for job in fl_parser.merge_jobs(host_job_lists):
+            job['host'] = host
+            job['job_key'] = fl_parser.get_job_key(job['url'])
+            jobs.append(job)
+
+    return jobs
+
 # Отправить всем пользователям уведомления о новых проектах
 async def notify_users(bot: Bot, user_id=None) -> bool:
     """Возвращаемое значение:
     True, если сообщения фактически были кому-то отправлены;
     False, если никаких отправок не было (к обработке ошибок это не относится).
+
+    Каждый уникальный запрос к бирже фриланса выполняется за цикл рассылки
+    только один раз, а его результат раздаётся всем пользователям с таким же
+    фильтром (каждому - относительно его собственного last_job_url).
+    Пользователи обрабатываются параллельно (не более NOTIFY_CONCURRENCY
+    одновременно), по мере поступления результатов нужных им запросов.
     """
+    subscriptions, fetch_keys = await _plan_fetches(
+        database.iter_active_users_async(user_id))
+
+    # Частота запросов к каждому сайту ограничивается в fl_parser, поэтому
+    # все запросы запускаются сразу, а к разным сайтам - выполняются
+    # параллельно
+    fetch_tasks = {fetch_key: asyncio.ensure_future(_fetch(fetch_key,
+                                                           seen_jobs))
+                   for fetch_key, seen_jobs in fetch_keys.items()}
+
+    # Общие ленты проектов по категориям для каждого сайта, распределяемые
+    # по всем уникальным фильтрам по категориям за один проход (только в
+    # режиме CATEGORY_INGESTION)
+    pool_tasks = {}
+    if CATEGORY_INGESTION:
+        route_keys = {host: {} for host in fl_parser.HOSTS}
+        for user, host, job_filters in subscriptions:
+            for job_filter in job_filters:
+                if not job_filter.keywords:
+                    route_keys[host][_get_route_key(job_filter)] = True
+
+        for host in fl_parser.HOSTS:
+            pool_tasks[host] = asyncio.ensure_future(_route_category_pool(
+                host,
+                [task for fetch_key, task in fetch_tasks.items()
+                 if fetch_key[0] == host and not fetch_key[3]],
+                list(route_keys[host])))
+
+    semaphore = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+    checkpoints = []
+    deliveries = []
+    telegram_sends = []
+    try:
+        results = await asyncio.gather(
+            *[_notify_subscription(bot, semaphore, user, host, job_filters,
+                                   fetch_tasks, pool_tasks, checkpoints,
+                                   deliveries, telegram_sends)
+              for user, host, job_filters in subscriptions],
+            *fetch_tasks.values(), *pool_tasks.values(),
+            return_exceptions=True)
+    finally:
+        # Каждый полученный за цикл проект сохраняется один раз; записи о
+        # доставке ссылаются на сохранённые проекты, поэтому пишутся после
+        # них. Все продвижения last_job_url за цикл записываются одной
+        # транзакцией
+        jobs = _collect_jobs(fetch_tasks)
+        if jobs:
+            await database.save_jobs_async(jobs)
+
+        # Сообщения Telegram, уже отправленные к этому моменту, учитываются
+        # вместе с остальными доставками, а прочие - по мере их отправки
+        for future, records in telegram_sends:
+            if not future.done():
+                future.add_done_callback(partial(_save_sent_deliveries,
+                                                 records))
+            elif not future.cancelled() and future.result():
+                deliveries.extend(records)
+
+        if deliveries:
+            await database.save_deliveries_async(deliveries)
+        if checkpoints:
+            await database.save_checkpoints_async(checkpoints)
+
     result = False
+    for item in results[:len(subscriptions)]:
+        if isinstance(item, Exception):
+            logging.error(item)
+        elif item:
+            result = True
 
-    if user_id:
-        user = database.get_settings(user_id)
-        if user:
-            users = [user]
-        else:
-            users = []
-    else:
-        users = database.get_settings_all() or []
+    return result
 
-    for user in users:
-        if not (user['active'] or user['email_active']):
-            continue
+# Получить очередь исходящих сообщений Telegram
+def get_telegram_queue(bot: Bot) -> TelegramQueue:
+    global telegram_queue
 
-        for host in fl_parser.HOSTS:
-            jobs_complete_list = []
-            for query in ['keywords', 'categories']:
-                job_filters = database.get_filters(
-                    user_id=user['user_id'], host=host, query=query) or []
+    if telegram_queue is None:
+        telegram_queue = TelegramQueue(bot)
 
-                if not job_filters:
-                    continue
+    return telegram_queue
 
-                jobs = fl_parser.get_jobs(
-                    host=host,
-                    category_ids=job_filters[0]['categories'],
-                    subcategory_ids=job_filters[0]['subcategories'],
-                    keywords=job_filters[0]['keywords'])
+# Поставить в очередь сообщение пользователю в Telegram со списком проектов
+async def send_telegram(bot: Bot, user_id: str, host: str,
+                        jobs: list) -> asyncio.Future:
+    """Входные параметры:
+    bot: Bot - экземпляр бота;
+    user_id: str - строковый идентификатор пользователя Telegram;
+    host: str - адрес сайта биржи фриланса;
+    jobs: list - список проектов (см. fl_parser.get_jobs_fl_ru()).
+
+    Возвращаемое значение:
+    объект Future с результатом фактической отправки (см.
+    delivery.TelegramQueue.put()) или None, если сообщение не поставлено в
+    очередь.
+    """
+    msg = ''
+    for index, job in enumerate(jobs):
+        msg += (
+            f'<b><a href="{job["url"]}">{job["title"]}</a></b>'
+            + f'\n{EMO_MONEY} <b>{job["price"]}</b>'
+            + f' {EMO_POINT_RIGHT} '
+            + f'<b>{fl_parser.host_to_hashtag(host)}</b>'
+            + f'\n{job["description"]}')
+
+        if index < len(jobs) - 1:
+            msg += '\n\n\n'
 
-                jobs = fl_parser.get_recent_jobs(
-                    jobs=jobs, last_job_url=job_filters[0]['last_job_url'])
+    try:
+        return await get_telegram_queue(bot).put(
+            user_id, msg, parse_mode=ParseMode.HTML,
+            disable_web_page_preview=True)
+    except Exception as e:
+        logging.error(e)
+        return None
 
-                if not jobs:
-                    continue
+# Отправить пользователю e-mail со списком проектов
+async def send_jobs_email(email_receiver: str, host: str,
+                          jobs: list) -> bool:
+    """Входные параметры:
+    email_receiver: str - адрес получателя сообщения;
+    host: str - адрес сайта биржи фриланса;
+    jobs: list - список проектов (см. fl_parser.get_jobs_fl_ru()).
+    """
+    text = ''
+    html = HTML_BEGIN
 
-                database.save_filter(
-                    user_id=user['user_id'],
-                    host=host,
-                    categories=job_filters[0]['categories'],
-                    subcategories=job_filters[0]['subcategories'],
-                    keywords=job_filters[0]['keywords'],
-                    last_job_url=jobs[0]['url'])
-
-                if len(jobs) > MAX_JOB_COUNT:
-                    jobs = jobs[:MAX_JOB_COUNT]
-
-                i = 0
-                while i <= len(jobs) - 1:
-                    append = True
-                    for job in jobs_complete_list:
-                        if job['url'] == jobs[i]['url']:
-                            append = False
-                            break
-                    if append:
-                        jobs_complete_list.append(jobs[i])
-                        i += 1
-                    else:
-                        del jobs[i]
-
-                if user['active'] and jobs:
-                    msg = ''
-                    for index, job in enumerate(jobs):
-                        msg += (
-                            f'<b><a href="{job["url"]}">{job["title"]}</a></b>'
-                            + f'\n{EMO_MONEY} <b>{job["price"]}</b>'
-                            + f' {EMO_POINT_RIGHT} '
-                            + f'<b>{fl_parser.host_to_hashtag(host)}</b>'
-                            + f'\n{job["description"]}')
-
-                        if index < len(jobs) - 1:
-                            msg += '\n\n\n'
-
-                    try:
-                        await bot.send_message(user['user_id'], msg,
-                                               parse_mode=ParseMode.HTML,
-                                               disable_web_page_preview=True)
-                        result = True
-                    except Exception as e:
-                        logging.error(e)
-
-                if user['email_active'] and jobs:
-                    text = ''
-                    html = HTML_BEGIN
-
-                    for index, job in enumerate(jobs):
-                        html += (
-                            f'<p>\n<b><a href="{job["url"]}">'
-                            + f'{escape(job["title"])}</a></b>'
-                            + f'<br><b>Бюджет проекта:</b> {job["price"]}<br>'
-                            + f'{escape(job["description"])}\n</p>\n')
-
-                        text += (
-                            f'Заголовок проекта: {job["title"]}\n'
-                            + f'Ссылка на страницу проекта: {job["url"]}\n'
-                            + f'Бюджет: {job["price"]}\n'
-                            + f'Описание:\n{job["description"]}')
-
-                        if index < len(jobs) - 1:
-                            html += ('<p>--- + --- + --- + --- + --- + ---</p>'
-                                     + '\n')
-                            text += '\n\n--- + --- + --- + --- + --- + ---\n\n'
-
-                    html += HTML_END
-
-                    send_email(email_receiver=user['email'],
-                               email_subject=f'Новые проекты от {host}: '
-                                             + f'{jobs[0]["title"]}',
-                               text_content=text, html_content=html)
-                    result = True
-
-                await asyncio.sleep(randint(REQUEST_DELAY_MIN,
-                                            REQUEST_DELAY_MAX))
+    for index, job in enumerate(jobs):
+        html += (
+            f'<p>\n<b><a href="{job["url"]}">'
+            + f'{escape(job["title"])}</a></b>'
+            + f'<br><b>Бюджет проекта:</b> {job["price"]}<br>'
+            + f'{escape(job["description"])}\n</p>\n')
 
-    return result
+        text += (
+            f'Заголовок проекта: {job["title"]}\n'
+            + f'Ссылка на страницу проекта: {job["url"]}\n'
+            + f'Бюджет: {job["price"]}\n'
+            + f'Описание:\n{job["description"]}')
+
+        if index < len(jobs) - 1:
+            html += '<p>--- + --- + --- + --- + --- + ---</p>\n'
+            text += '\n\n--- + --- + --- + --- + --- + ---\n\n'
+
+    html += HTML_END
+
+    return await send_email(
+        email_receiver=email_receiver,
+        email_subject=f'Новые проекты от {host}: {jobs[0]["title"]}',
+        text_content=text, html_content=html)
+
+# Получить отправителя e-mail
+def get_email_sender() -> EmailSender:
+    global email_sender
+
+    if email_sender is None:
+        email_sender = EmailSender(SMTP_SERVER, SMTP_PORT,
+                                   user=BOT_EMAIL, password=BOT_PASSWORD)
+
+    return email_sender
 
 # Отправить пользователю от имени бота сообщение по e-mail
-def send_email(email_receiver: str, email_subject: str,
-               text_content: str, html_content: str):
+async def send_email(email_receiver: str, email_subject: str,
+                     text_content: str, html_content: str) -> bool:
     """Входные параметры:
     email_receiver: str - адрес получателя сообщения;
     email_subject: str - тема письма;
@@ -204,13 +552,4 @@ def send_email(email_receiver: str, email_subject: str,
     message.attach(MIMEText(text_content, 'plain', 'utf-8'))
     message.attach(MIMEText(html_content, 'html', 'utf-8'))
 
-    context = ssl.create_default_context()
-    try:
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls(context=context)
-        server.login(BOT_EMAIL, BOT_PASSWORD)
-        server.sendmail(BOT_EMAIL, email_receiver, message.as_string())
-    except Exception as e:
-        logging.error(e)
-    finally:
-        server.quit()
+    return await get_email_sender().send(email_receiver, message)
@@ -0,0 +1,236 @@
+"""Замер поиска по дереву категорий: исходный перебор списков
+categories_fl_ru/categories_fl_ua сравнивается с индексами build_cat_index()
+на синтетических деревьях (FL.ru - 20 категорий по 30 подкатегорий,
+Freelance.ua - 15 категорий по 25 подкатегорий с ключевыми словами).
+
+Запуск из корня репозитория: python tests/bench_categories.py
+Перед замером проверяется совпадение результатов обеих реализаций.
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import timeit
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+# Модули бота лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fl_parser
+import menu
+from emoticons import EMO_CHECK_MARK, EMO_REWIND
+from fl_parser import HOST_FL_RU, HOST_FL_UA, HOSTS
+
+# Количество повторов замера, из которых берется лучший
+REPEAT = 5
+
+
+# Исходные функции поиска перебором дерева категорий
+def baseline_tree(host: str) -> list:
+    if host == HOST_FL_RU:
+        return fl_parser.categories_fl_ru
+    return fl_parser.categories_fl_ua
+
+def baseline_get_catlist(host: str) -> list:
+    return [{'id': cat['id'], 'title': cat['title']}
+            for cat in baseline_tree(host)]
+
+def baseline_get_subcatlist(host: str, category_id: str) -> list:
+    for category in baseline_tree(host):
+        if category['id'] == category_id:
+            if host == HOST_FL_UA:
+                return [{'id': cat['id'], 'title': cat['title'],
+                         'keyword': cat['keyword']}
+                        for cat in category['children']]
+            return [{'id': cat['id'], 'title': cat['title']}
+                    for cat in category['children']]
+    return []
+
+def baseline_is_category_child(host: str, category_id: str,
+                               subcategory_id: str) -> bool:
+    for cat in baseline_get_subcatlist(host, category_id):
+        if cat['id'] == subcategory_id:
+            return True
+    return False
+
+def baseline_get_parent_id(host: str, subcategory_id: str) -> str:
+    for cat in baseline_get_catlist(host):
+        if baseline_is_category_child(host, cat['id'], subcategory_id):
+            return cat['id']
+    return ''
+
+def baseline_get_all_titles(host: str) -> dict:
+    result = {}
+    for cat in baseline_get_catlist(host):
+        result[cat['id']] = cat['title']
+        for subcat in baseline_get_subcatlist(host, cat['id']):
+            result[subcat['id']] = subcat['title']
+    return result
+
+def baseline_assemble_catlist(host: str, category_ids: list,
+                              subcategory_ids: list) -> tuple:
+    cat_ids = category_ids[:]
+    subcat_ids = subcategory_ids[:]
+    for cat in baseline_get_catlist(host):
+        if cat['id'] in cat_ids:
+            continue
+
+        append = True
+        for subcat in baseline_get_subcatlist(host, cat['id']):
+            if subcat['id'] not in subcat_ids:
+                append = False
+                break
+        if append:
+            cat_ids.append(cat['id'])
+
+    for cat_id in cat_ids:
+        for subcat in baseline_get_subcatlist(host, cat_id):
+            index = -1
+            for i, subcat_id in enumerate(subcat_ids):
+                if subcat_id == subcat['id']:
+                    index = i
+                    break
+            if index > -1:
+                del subcat_ids[index]
+
+    return (cat_ids, subcat_ids)
+
+# Исходная разметка меню выбора категорий (без чтения фильтра из базы)
+def baseline_select_category(host: str, categories: list,
+                             subcategories: list) -> InlineKeyboardMarkup:
+    markup = InlineKeyboardMarkup()
+
+    catlist = baseline_get_catlist(host)
+    for index, category in enumerate(catlist):
+        if index % 2 != 0:
+            continue
+
+        row = []
+        cats = [category]
+        if index < len(catlist) - 1:
+            cats.append(catlist[index + 1])
+
+        for cat in cats:
+            title = cat['title']
+
+            if cat['id'] in categories:
+                title = f'{EMO_CHECK_MARK}{EMO_CHECK_MARK} {title}'
+            else:
+                for subcat_id in subcategories:
+                    if baseline_is_category_child(host, cat['id'], subcat_id):
+                        title = f'{EMO_CHECK_MARK} {title}'
+                        break
+
+            row.append(InlineKeyboardButton(text=title,
+                                            callback_data=cat['id']))
+        markup.row(*row)
+
+    markup.row(InlineKeyboardButton(text=f'{EMO_REWIND} Возврат',
+                                    callback_data='back'))
+
+    return markup
+
+# Синтетическое дерево категорий
+def make_tree(n_cats: int, n_subs: int, keywords: bool) -> list:
+    tree = []
+    for i in range(n_cats):
+        cat_id = str(i + 1)
+        children = []
+        for j in range(n_subs):
+            subcat = {'id': fl_parser.combine_cat_ids(cat_id, str(j + 1)),
+                      'title': f'Подкатегория {i}.{j}'}
+            if keywords:
+                subcat['keyword'] = f'keyword_{i}_{j}'
+            children.append(subcat)
+        tree.append({'id': cat_id, 'title': f'Категория {i}',
+                     'children': children})
+    return tree
+
+# Проверить совпадение результатов исходных функций и функций с индексами
+def check_equivalence():
+    rnd = random.Random(1)
+    for host in HOSTS:
+        assert baseline_get_catlist(host) == fl_parser.get_catlist(host)
+        titles = baseline_get_all_titles(host)
+        assert titles == dict(fl_parser.get_all_titles(host))
+        subcat_ids = [cat_id for cat_id in titles if len(cat_id) == 8]
+        for cat in baseline_get_catlist(host) + [{'id': '999'}]:
+            assert (baseline_get_subcatlist(host, cat['id']) ==
+                    fl_parser.get_subcatlist(host, cat['id']))
+        for subcat_id in subcat_ids + ['x']:
+            assert (baseline_get_parent_id(host, subcat_id) ==
+                    fl_parser.get_parent_id(host, subcat_id))
+            for cat_id in ('1', '2', '7'):
+                assert (baseline_is_category_child(host, cat_id, subcat_id) ==
+                        fl_parser.is_category_child(host, cat_id, subcat_id))
+        for _ in range(500):
+            cats = rnd.sample([cat['id'] for cat in baseline_get_catlist(host)],
+                              rnd.randint(0, 3))
+            subcats = rnd.sample(subcat_ids, rnd.randint(0, 200))
+            assert (baseline_assemble_catlist(host, cats, subcats) ==
+                    fl_parser.assemble_catlist(host, cats, subcats))
+
+# Среднее время одного вызова в микросекундах (лучшее из REPEAT повторов)
+def bench(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=REPEAT)) / number * 1e6
+
+def report(name: str, old_func, new_func, number: int):
+    old_time = bench(old_func, number)
+    new_time = bench(new_func, number)
+    print(f'{name:<32} {old_time:>10.2f} us -> {new_time:>8.2f} us '
+          f'(x{old_time / new_time:.0f})')
+
+def main():
+    logging.disable(logging.INFO)
+
+    fl_parser.categories_fl_ru[:] = make_tree(20, 30, keywords=False)
+    fl_parser.categories_fl_ua[:] = make_tree(15, 25, keywords=True)
+    for host in HOSTS:
+        fl_parser.build_cat_index(host)
+
+    check_equivalence()
+
+    host = HOST_FL_RU
+    rnd = random.Random(1)
+    subcat_ids = [cat_id for cat_id in fl_parser.get_all_titles(host)
+                  if len(cat_id) == 8]
+    categories = ['3']
+    subcategories = rnd.sample(subcat_ids, 40)
+
+    # Фильтр пользователя подставляется без обращения к базе данных, чтобы
+    # замер включал только построение меню
+    async def get_cat_filter(user_id: str, host: str) -> tuple:
+        return (categories, subcategories)
+    menu._get_cat_filter = get_cat_filter
+
+    loop = asyncio.new_event_loop()
+    report('get_select_category',
+           lambda: baseline_select_category(host, categories, subcategories),
+           lambda: loop.run_until_complete(
+               menu.get_select_category('1', host)), 200)
+    loop.close()
+
+    assembled = subcategories + [fl_parser.combine_cat_ids('5', str(j + 1))
+                                 for j in range(30)]
+    report('assemble_catlist',
+           lambda: baseline_assemble_catlist(host, categories, assembled),
+           lambda: fl_parser.assemble_catlist(host, categories, assembled),
+           200)
+    report('get_all_titles',
+           lambda: baseline_get_all_titles(host),
+           lambda: fl_parser.get_all_titles(host), 200)
+
+    # Подкатегория последней категории - худший случай для перебора
+    last_subcat_id = fl_parser.combine_cat_ids('20', '30')
+    report('is_category_child (last)',
+           lambda: baseline_is_category_child(host, '20', last_subcat_id),
+           lambda: fl_parser.is_category_child(host, '20', last_subcat_id),
+           10000)
+    report('get_parent_id (last)',
+           lambda: baseline_get_parent_id(host, last_subcat_id),
+           lambda: fl_parser.get_parent_id(host, last_subcat_id), 2000)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# Модули бота лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import fl_parser
+
+# Число проектов на странице списка проектов FakeSite
+PAGE_SIZE = 10
+
+
+# Выполнить сопрограмму в новом цикле событий, закрываемом после выполнения
+def _run_async(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+# Функция выполнения сопрограммы в отдельном цикле событий (см. _run_async())
+@pytest.fixture
+def run():
+    return _run_async
+
+
+# База данных во временном файле с отдельным потоком для асинхронных функций
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    database.close_connections()
+    database.clear_cache()
+    monkeypatch.setattr(database, 'DB_NAME', str(tmp_path / 'test.db'))
+    monkeypatch.setattr(database, '_executor', ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix='database'))
+    database.init()
+    yield database
+
+    _run_async(database.close_async())
+    database.close_connections()
+    database.clear_cache()
+
+
+class FakeBot:
+    """Бот, запоминающий отправленные сообщения по чатам. fail - разовые сбои
+    при отправке заданных сообщений: (chat_id, text) -> исключение; delay -
+    длительность отправки заданных сообщений: (chat_id, text) -> секунды;
+    сообщения в чаты из failing отклоняются постоянной ошибкой.
+    """
+    def __init__(self, fail: dict=None, delay: dict=None, failing=()):
+        self.received = {}
+        self.fail = fail or {}
+        self.delay = delay or {}
+        self.failing = set(failing)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.delay.pop((chat_id, text), 0))
+        error = self.fail.pop((chat_id, text), None)
+        if error is not None:
+            raise error
+        if chat_id in self.failing:
+            raise ValueError('chat not found')
+        self.received.setdefault(chat_id, []).append(text)
+
+
+# Фабрика ботов Telegram с подменой отправки сообщений (см. FakeBot)
+@pytest.fixture
+def fake_bot():
+    return FakeBot
+
+
+class FakeSite:
+    """Сайт со списком проектов (от новых к старым) по PAGE_SIZE на страницу;
+    если paged равно False, номер страницы не учитывается.
+    """
+    def __init__(self, host: str, paged: bool=True):
+        self.host = host
+        self.paged = paged
+        self.ids = []
+        self.pages = []
+
+    def publish(self, ids):
+        self.ids[:0] = list(ids)
+
+    async def get_jobs_async(self, request, parse_func, iter_func, bounds):
+        fields = request.get('params') or request.get('data') or {}
+        page = int(fields.get('page', 1)) if self.paged else 1
+        self.pages.append(page)
+        await asyncio.sleep(0)
+        return [{
+            'title': f'Проект {n}',
+            'url': f'{self.host}/projects/{n}/',
+            'price': '',
+            'description': '',
+        } for n in self.ids[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]]
+
+
+# Подмена запросов страниц списка проектов (см. FakeSite); результаты
+# get_jobs_async() не кешируются
+@pytest.fixture
+def site(monkeypatch):
+    monkeypatch.setattr(fl_parser, 'JOBS_CACHE_TTL', 0)
+    monkeypatch.setattr(fl_parser, '_jobs_cache', OrderedDict())
+
+    def make(host: str, paged: bool=True) -> FakeSite:
+        fake = FakeSite(host, paged)
+        monkeypatch.setattr(fl_parser, '_get_jobs_async', fake.get_jobs_async)
+        return fake
+
+    return make
@@ -0,0 +1,75 @@
+"""Проверка построения структур категорий при запуске и их фонового
+обновления с повторными попытками после неудачи.
+"""
+import asyncio
+
+import pytest
+
+import fl_parser
+
+
+# Пауза, прерывающая задачу обновления после заданного числа вызовов
+class StopAfter:
+    def __init__(self, count: int):
+        self.count = count
+        self.delays = []
+
+    async def __call__(self, delay):
+        self.delays.append(delay)
+        if len(self.delays) >= self.count:
+            raise asyncio.CancelledError()
+
+
+# Исходные деревья категорий восстанавливаются после каждого теста
+@pytest.fixture(autouse=True)
+def cat_trees(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    trees = {host: fl_parser._get_cat_tree(host) for host in fl_parser.HOSTS}
+    yield
+    for host, tree in trees.items():
+        if tree:
+            fl_parser.set_cat_tree(host, tree)
+
+
+@pytest.mark.parametrize('ru, ua', [(False, False), (True, False),
+                                    (False, True)])
+def test_init_reports_failed_build(monkeypatch, ru, ua):
+    monkeypatch.setattr(fl_parser, 'build_catlist_fl_ru', lambda: ru)
+    monkeypatch.setattr(fl_parser, 'build_catlist_fl_ua', lambda: ua)
+
+    assert fl_parser.init() is True
+
+
+def test_init_built_trees_need_no_refresh(monkeypatch):
+    monkeypatch.setattr(fl_parser, 'build_catlist_fl_ru', lambda: True)
+    monkeypatch.setattr(fl_parser, 'build_catlist_fl_ua', lambda: True)
+
+    assert fl_parser.init() is False
+
+
+def test_init_snapshot_needs_refresh(monkeypatch):
+    monkeypatch.setattr(fl_parser, 'load_cat_snapshot', lambda: True)
+
+    assert fl_parser.init() is True
+
+
+def test_refresh_task_retries_with_backoff(monkeypatch, run):
+    results = iter([False, False, Exception('нет связи'), True, False])
+
+    async def refresh():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    sleep = StopAfter(5)
+    monkeypatch.setattr(fl_parser, 'refresh_catlists_async', refresh)
+    monkeypatch.setattr(fl_parser, 'CATLIST_RETRY_PERIOD', 10)
+    monkeypatch.setattr(fl_parser, 'CATLIST_REFRESH_PERIOD', 1000)
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+
+    with pytest.raises(asyncio.CancelledError):
+        run(fl_parser.refresh_catlists_task(refresh_now=True))
+
+    # Три неудачи подряд, успешное обновление и снова неудача
+    assert sleep.delays == [10, 20, 40, 1000, 10]
@@ -0,0 +1,111 @@
+"""Проверка запросов списков проектов и их постраничного обхода с подменой
+запросов к биржам фриланса.
+"""
+from collections import OrderedDict
+
+import pytest
+
+import fl_parser
+from fl_parser import HOST_FL_RU, HOST_FL_UA
+
+
+@pytest.fixture
+def crawl(run):
+    """Функция обхода списка проектов по ключевым словам (возвращает номера
+    полученных проектов).
+    """
+    def crawl_jobs(host: str, max_pages: int, seen_jobs=()) -> list:
+        if host == HOST_FL_RU:
+            coro = fl_parser.get_jobs_fl_ru_async(keywords='python',
+                                                  max_pages=max_pages,
+                                                  seen_jobs=seen_jobs)
+        else:
+            coro = fl_parser.get_jobs_fl_ua_async(keywords='python',
+                                                  max_pages=max_pages,
+                                                  seen_jobs=seen_jobs)
+        return [int(fl_parser.get_job_key(job['url'])) for job in run(coro)]
+
+    return crawl_jobs
+
+
+def _seen(ids) -> set:
+    return {str(n) for n in ids}
+
+
+def test_crawl_without_seen_jobs_reads_first_page(site, crawl):
+    fake = site(HOST_FL_UA)
+    fake.publish(range(100, 0, -1))
+    assert crawl(HOST_FL_UA, 5) == list(range(100, 90, -1))
+    assert crawl(HOST_FL_UA, 5, [set(), {}]) == list(range(100, 90, -1))
+    assert fake.pages == [1, 1]
+
+
+def test_crawl_stops_at_seen_job(site, crawl):
+    fake = site(HOST_FL_UA)
+    fake.publish(range(125, 0, -1))
+
+    # Всплеск публикаций: обход доходит до страницы с просмотренным проектом
+    assert crawl(HOST_FL_UA, 5, [_seen(range(100, 90, -1))]) == \
+        list(range(125, 95, -1))
+
+
+def test_crawl_stops_when_all_subscribers_reached(site, crawl):
+    fake = site(HOST_FL_UA)
+    fake.publish(range(123, 0, -1))
+
+    # Один получатель ленты видел проекты до 108, другой - только до 100:
+    # обход продолжается, пока не встретятся проекты, известные обоим
+    seen_jobs = [_seen(range(108, 90, -1)), _seen(range(100, 90, -1))]
+    assert crawl(HOST_FL_UA, 5, seen_jobs) == list(range(123, 93, -1))
+
+
+def test_crawl_stops_when_page_ignored(site, crawl):
+    fake = site(HOST_FL_UA, paged=False)
+    fake.publish(range(125, 0, -1))
+
+    # Сайт отдаёт первую страницу на любой запрос: обход прекращается на
+    # первой странице без новых проектов, а не по достижении max_pages
+    assert crawl(HOST_FL_UA, 10, [_seen(range(100, 90, -1))]) == \
+        list(range(125, 115, -1))
+    # Первая страница и одно окно предварительно запрошенных страниц
+    assert len(fake.pages) <= 2 + fl_parser.CRAWL_PREFETCH_PAGES
+
+
+def test_crawl_fl_ru_single_page(site, crawl):
+    fake = site(HOST_FL_RU)
+    fake.publish(range(125, 0, -1))
+
+    assert crawl(HOST_FL_RU, 5, [_seen(range(100, 90, -1))]) == \
+        list(range(125, 115, -1))
+    assert fake.pages == [1]
+
+
+def test_validators_sent_only_with_get(monkeypatch, run):
+    monkeypatch.setattr(fl_parser, '_page_cache', OrderedDict())
+    sent_headers = []
+
+    async def request_async(url, params=None, data=None, headers=None):
+        sent_headers.append(dict(headers or {}))
+        return (200, '', {'ETag': '"v1"',
+                          'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+
+    monkeypatch.setattr(fl_parser, '_request_async', request_async)
+
+    async def fetch_twice(request: dict, parse_func):
+        for _ in range(2):
+            await fl_parser._get_jobs_async(request, parse_func, None,
+                                            ('', ''))
+
+    run(fetch_twice(fl_parser.get_request_fl_ru(keywords='python'),
+                    fl_parser.parse_jobs_fl_ru))
+    run(fetch_twice(fl_parser.get_request_fl_ua(keywords='python'),
+                    fl_parser.parse_jobs_fl_ua))
+
+    # POST-запрос FL.ru повторяется без валидаторов, GET-запрос Freelance.ua -
+    # с ними
+    assert sent_headers[:2] == [{}, {}]
+    assert sent_headers[2] == {}
+    assert sent_headers[3] == {
+        'If-None-Match': '"v1"',
+        'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT',
+    }
@@ -0,0 +1,80 @@
+"""Проверка потокового чтения активных пользователей из базы данных.
+"""
+import fl_parser
+
+
+def test_active_users_are_streamed_in_batches(db, monkeypatch, run):
+    for user_id in range(1, 26):
+        db.save_settings(str(user_id), active=user_id % 5 != 0)
+        db.save_filter(str(user_id), fl_parser.HOST_FL_RU,
+                       keywords=f'python{user_id}')
+        db.save_filter(str(user_id), fl_parser.HOST_FL_UA,
+                       categories=['1', '2'])
+
+    monkeypatch.setattr(db, 'FETCH_BATCH_SIZE', 3)
+    async def collect():
+        return [user async for user in db.iter_active_users_async()]
+
+    users = run(collect())
+
+    assert [user.user_id for user in users] == \
+        [str(user_id) for user_id in range(1, 26) if user_id % 5 != 0]
+    assert users == list(db.iter_active_users())
+
+    filters = {job_filter.host: job_filter for job_filter in users[0].filters}
+    assert filters[fl_parser.HOST_FL_RU].keywords == 'python1'
+    assert filters[fl_parser.HOST_FL_UA].categories == ('1', '2')
+
+
+def test_stream_can_be_closed_early(db, monkeypatch, run):
+    for user_id in range(1, 11):
+        db.save_settings(str(user_id), active=True)
+        db.save_filter(str(user_id), fl_parser.HOST_FL_RU, keywords='php')
+
+    monkeypatch.setattr(db, 'FETCH_BATCH_SIZE', 2)
+
+    async def take_three():
+        users = db.iter_active_users_async()
+        taken = []
+        async for user in users:
+            taken.append(user.user_id)
+            if len(taken) == 3:
+                break
+        await users.aclose()
+        return taken
+
+    assert run(take_three()) == ['1', '2', '3']
+
+
+def test_changed_filter_forgets_seen_jobs(db):
+    db.save_settings('1', active=True)
+    db.save_filter('1', fl_parser.HOST_FL_RU, keywords='python')
+    db.save_filter('1', fl_parser.HOST_FL_UA, categories=['1'],
+                   subcategories=['00020001'])
+    db.save_checkpoints([{
+        'user_id': '1', 'host': host, 'query': query,
+        'last_job_url': f'{host}/projects/1/', 'seen_jobs': {'1': 100},
+    } for host, query in ((fl_parser.HOST_FL_RU, 'keywords'),
+                          (fl_parser.HOST_FL_UA, 'categories'))])
+
+    def seen_jobs() -> dict:
+        user, = db.iter_active_users()
+        return {job_filter.host: job_filter.seen_jobs
+                for job_filter in user.filters}
+
+    # Сохранение без изменений не сбрасывает просмотренные проекты
+    db.save_filter('1', fl_parser.HOST_FL_RU, keywords='python',
+                   last_job_url=f'{fl_parser.HOST_FL_RU}/projects/1/')
+    db.save_filter('1', fl_parser.HOST_FL_UA, categories=['1'],
+                   subcategories=['00020001'],
+                   last_job_url=f'{fl_parser.HOST_FL_UA}/projects/1/')
+    assert seen_jobs() == {fl_parser.HOST_FL_RU: {'1': 100},
+                           fl_parser.HOST_FL_UA: {'1': 100}}
+
+    db.save_filter('1', fl_parser.HOST_FL_RU, keywords='python,django',
+                   last_job_url=f'{fl_parser.HOST_FL_RU}/projects/1/')
+    db.save_filter('1', fl_parser.HOST_FL_UA, categories=['1'],
+                   subcategories=['00020002'],
+                   last_job_url=f'{fl_parser.HOST_FL_UA}/projects/1/')
+    assert seen_jobs() == {fl_parser.HOST_FL_RU: {},
+                           fl_parser.HOST_FL_UA: {}}
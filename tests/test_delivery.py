@@ -0,0 +1,74 @@
+"""Проверка порядка доставки сообщений очередью TelegramQueue.
+"""
+import asyncio
+
+from aiogram.utils.exceptions import RetryAfter, NetworkError
+
+import delivery
+
+
+def test_messages_keep_order_within_chat(monkeypatch, run, fake_bot):
+    monkeypatch.setattr(delivery, 'RETRY_DELAY', 0.05)
+    bot = fake_bot(fail={
+        ('1', 'm2'): NetworkError('network'),
+        ('2', 'n1'): RetryAfter(1),
+    })
+
+    async def send():
+        queue = delivery.TelegramQueue(bot, rate=100, chat_interval=0.05)
+        for i in range(1, 6):
+            await queue.put('1', f'm{i}')
+            await queue.put('2', f'n{i}')
+            await queue.put(str(10 + i), 'x')
+        await asyncio.sleep(0.1)
+        await queue.put('1', 'm6')
+        await queue.stop(timeout=10)
+        return queue.get_stats()
+
+    stats = run(send())
+
+    assert bot.received['1'] == [f'm{i}' for i in range(1, 7)]
+    assert bot.received['2'] == [f'n{i}' for i in range(1, 6)]
+    assert stats['depth'] == 0
+    assert stats['sent'] == 16
+    assert stats['retried'] == 2
+
+
+def test_slow_send_blocks_chat(monkeypatch, run, fake_bot):
+    monkeypatch.setattr(delivery, 'RETRY_DELAY', 0.05)
+    bot = fake_bot(fail={('1', 'm1'): NetworkError('network')},
+                  delay={('1', 'm1'): 0.3})
+
+    async def send():
+        queue = delivery.TelegramQueue(bot, rate=100, chat_interval=0.05)
+        await queue.put('1', 'm1')
+        await queue.put('1', 'm2')
+        await queue.put('2', 'n1')
+        await asyncio.sleep(0.1)
+        # Сообщения в другие чаты не ждут медленной отправки
+        assert bot.received == {'2': ['n1']}
+        await queue.stop(timeout=10)
+
+    run(send())
+
+    assert bot.received['1'] == ['m1', 'm2']
+
+
+def test_put_reports_final_result(monkeypatch, run, fake_bot):
+    monkeypatch.setattr(delivery, 'RETRY_DELAY', 0.01)
+    bot = fake_bot(fail={
+        ('1', 'bad'): ValueError('bad request'),
+        ('2', 'retry'): NetworkError('network'),
+    })
+
+    async def send():
+        queue = delivery.TelegramQueue(bot, rate=100, chat_interval=0,
+                                       max_retries=1)
+        futures = [await queue.put('1', 'ok'),
+                   await queue.put('1', 'bad'),
+                   await queue.put('2', 'retry')]
+        results = await asyncio.gather(*futures)
+        await queue.stop()
+        return results
+
+    assert run(send()) == [True, False, True]
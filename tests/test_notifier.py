@@ -0,0 +1,144 @@
+"""Проверка цикла рассылки уведомлений с подменой бирж фриланса и Telegram.
+"""
+import asyncio
+
+import pytest
+
+import fl_parser
+import notifier
+
+
+def _make_jobs(ids) -> list:
+    return [{
+        'title': f'Проект {n}',
+        'url': f'{fl_parser.HOST_FL_RU}/projects/{n}/proekt-{n}.html',
+        'price': f'{n} руб.',
+        'description': f'Описание {n}',
+    } for n in ids]
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    """Лента проектов FL.ru, возвращаемая вместо запросов к бирже (от новых
+    к старым).
+    """
+    jobs = []
+
+    async def get_jobs_async(host, category_ids=[], subcategory_ids=[],
+                             keywords='', max_pages=1, seen_jobs=()):
+        return [dict(job) for job in jobs] if host == fl_parser.HOST_FL_RU \
+            else []
+
+    monkeypatch.setattr(fl_parser, 'get_jobs_async', get_jobs_async)
+    monkeypatch.setattr(notifier, 'telegram_queue', None)
+    return jobs
+
+
+@pytest.fixture
+def notify(run):
+    """Функция выполнения цикла рассылки notify_users() с ожиданием отправки
+    всех поставленных в очередь сообщений.
+    """
+    def notify_users(bot, user_id=None) -> bool:
+        async def notify():
+            result = await notifier.notify_users(bot, user_id)
+            if notifier.telegram_queue is not None:
+                await notifier.telegram_queue.stop()
+                notifier.telegram_queue = None
+            # Дать завершиться сохранению доставок после отправки
+            await asyncio.sleep(0.2)
+            return result
+
+        return run(notify())
+
+    return notify_users
+
+
+def _delivered(db) -> set:
+    cur = db.get_connection().execute(
+        'SELECT delivery.user_id, job.job_key FROM delivery '
+        'JOIN job ON job.id = delivery.job_id')
+    return {(str(user_id), job_key) for user_id, job_key in cur}
+
+
+def test_delivery_recorded_only_after_send(db, feed, notify, fake_bot):
+    for user_id in ('1', '2'):
+        db.save_settings(user_id, active=True)
+        db.save_filter(user_id, fl_parser.HOST_FL_RU, keywords='python')
+    feed.extend(_make_jobs([3, 2, 1]))
+
+    bot = fake_bot(failing={'2'})
+    assert notify(bot)
+
+    assert len(bot.received['1']) == 1
+    assert _delivered(db) == {('1', '3'), ('1', '2'), ('1', '1')}
+
+
+def test_burst_sent_in_several_messages(db, feed, notify, fake_bot):
+    db.save_settings('1', active=True)
+    db.save_filter('1', fl_parser.HOST_FL_RU, keywords='python')
+
+    # Для нового фильтра отправляются только самые свежие проекты ленты
+    feed.extend(_make_jobs(range(15, 0, -1)))
+    bot = fake_bot()
+    assert notify(bot)
+    assert len(bot.received['1']) == 1
+    assert len(_delivered(db)) == notifier.MAX_JOB_COUNT
+
+    # Всплеск публикаций между циклами: все новые проекты доставляются
+    feed[:0] = _make_jobs(range(40, 15, -1))
+    bot = fake_bot()
+    assert notify(bot)
+    assert len(bot.received['1']) == 3
+    assert {job_key for user_id, job_key in _delivered(db)} >= {
+        str(n) for n in range(16, 41)}
+    assert len(_delivered(db)) == notifier.MAX_JOB_COUNT + 25
+
+    # Отправленные проекты повторно не отправляются
+    bot = fake_bot()
+    assert not notify(bot)
+    assert bot.received == {}
+
+
+def test_changed_filter_is_capped(db, feed, notify, fake_bot):
+    db.save_settings('1', active=True)
+    db.save_filter('1', fl_parser.HOST_FL_RU, keywords='python')
+    feed.extend(_make_jobs(range(40, 0, -1)))
+    assert notify(fake_bot())
+
+    # Изменение ключевых слов, как в bot.input_keywords(): last_job_url
+    # сохраняется, а лента нового фильтра отличается от прежней
+    job_filter, = db.get_filters('1', host=fl_parser.HOST_FL_RU,
+                                 query='keywords')
+    db.save_filter('1', fl_parser.HOST_FL_RU, keywords='django',
+                   last_job_url=job_filter['last_job_url'])
+    feed[:] = _make_jobs(range(140, 100, -1))
+
+    bot = fake_bot()
+    assert notify(bot)
+    assert len(bot.received['1']) == 1
+    assert len(_delivered(db)) == 2 * notifier.MAX_JOB_COUNT
+
+
+def test_update_does_not_shorten_crawl_for_others(db, site, notify,
+                                                  fake_bot):
+    fake = site(fl_parser.HOST_FL_UA)
+    for user_id in ('1', '2'):
+        db.save_settings(user_id, active=True)
+        db.save_filter(user_id, fl_parser.HOST_FL_UA, keywords='python')
+    fake.publish(range(100, 0, -1))
+    assert notify(fake_bot())
+
+    # Пользователь 1 запрашивает проекты вне очереди (/update)
+    fake.publish(range(108, 100, -1))
+    bot = fake_bot()
+    assert notify(bot, user_id='1')
+    assert list(bot.received) == ['1']
+
+    # Очередной цикл рассылки: пользователь 2 получает все новые для него
+    # проекты, хотя обход по запросу пользователя 1 остановился раньше
+    fake.publish(range(123, 108, -1))
+    assert notify(fake_bot())
+    delivered = {job_key for user_id, job_key in _delivered(db)
+                 if user_id == '2'}
+    assert delivered >= {str(n) for n in range(101, 124)}
@@ -0,0 +1,220 @@
+"""Дифференциальная проверка разбора страниц со списками проектов: результат
+parse_jobs_fl_ru()/parse_jobs_fl_ua() (для каждого движка разбора) и
+iter_jobs_fl_ru()/iter_jobs_fl_ua() сравнивается с результатом исходного
+разбора полного дерева страницы встроенным html.parser.
+"""
+import re
+from html import unescape
+
+import pytest
+from bs4 import BeautifulSoup
+
+import fl_parser
+from fl_parser import HOST_FL_RU, PRICE_RE, DESCRIPTION_RE, clean_text
+
+BACKENDS = ['lxml', 'html.parser']
+
+
+# Исходный разбор страницы FL.ru (до выбора движка и фильтров элементов)
+def baseline_parse_fl_ru(html: str) -> list:
+    if html:
+        jobs = []
+        soup = BeautifulSoup(html, 'html.parser')
+        posts = soup.find_all('div', class_='b-post') or []
+        for post in posts:
+            job = {}
+
+            if post.find('h2', class_='b-post__pin'):
+                job['pinned'] = True
+
+            title = post.find('a', class_='b-post__link')
+            if title:
+                job['title'] = title.get_text(strip=True)
+                job['url'] = HOST_FL_RU + title.get('href', '')
+
+            scripts = post.find_all('script', type='text/javascript')
+            if scripts:
+                multiscript = '\n'.join([str(script) for script in scripts])
+
+                search_results = re.findall(PRICE_RE, multiscript)
+                if search_results:
+                    job['price'] = unescape(search_results[0]).strip()
+
+                search_results = re.findall(DESCRIPTION_RE, multiscript)
+                if search_results:
+                    job['description'] = unescape(search_results[0]).strip()
+
+            jobs.append(job)
+        return jobs
+    else:
+        return []
+
+
+# Исходный разбор страницы Freelance.ua
+def baseline_parse_fl_ua(html: str) -> list:
+    if html:
+        jobs = []
+        soup = BeautifulSoup(html, 'html.parser')
+        root = soup.find('ul', class_='l-projectList')
+        if root:
+            items = root.findChildren('li', recursive=False) or []
+            for item in items:
+                job = {}
+
+                project_title = item.find('header', class_='l-project-title')
+                if project_title:
+                    if project_title.find('i', class_='c-icon-fixed'):
+                        job['pinned'] = True
+
+                    title_link = project_title.findChild('a', recursive=False)
+                    if title_link:
+                        job['title'] = title_link.get_text().strip()
+                        job['url'] = title_link.get('href', '')
+
+                project_head = item.find('div', class_='l-project-head')
+                if project_head:
+                    price = project_head.findChild('span', recursive=False)
+                    if price:
+                        job['price'] = price.get_text().strip()
+
+                article = item.find('article')
+                if article:
+                    description = article.findChild('p', recursive=False)
+                    job['description'] = clean_text(description.get_text())
+
+                jobs.append(job)
+        return jobs
+    else:
+        return []
+
+
+FL_RU_POST = '''\
+<div id="project-item{n}" class="b-post b-post_padbot_15 b-post_relative">
+  {pin}<h2 class="b-post__title b-post__grid_title">
+    <a id="prj_name_{n}" class="b-post__link"
+       href="/projects/{n}/proekt-{n}.html">Проект &laquo;{n}&raquo; &amp; Co</a>
+  </h2>
+  <script type="text/javascript">document.write('<div class="b-post__price \
+b-layuot_right b-post__price_bold">{n}00&nbsp;&#8381;</div>');</script>
+  <script type="text/javascript">document.write('<div class="b-post__body \
+b-post__grid_descript"><div class="b-post__txt ">Нужен &quot;сайт&quot; \
+для {n} &lt;клиентов&gt;</div></div>');</script>
+  <div class="b-post__foot"><span class="b-post__bold">Ответов: {n}</span></div>
+</div>
+'''
+
+
+def fl_ru_page(ids: list, pinned=()) -> str:
+    posts = ''.join(FL_RU_POST.format(
+        n=n, pin='<h2 class="b-post__pin">Закреплён</h2>' if n in pinned
+        else '') for n in ids)
+    return f'''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Проекты</title>
+<script>var filter_specs = new Array();
+filter_specs[5]=[[37,'Веб-программирование'],[2,'Прикладное ПО']];</script>
+</head><body>
+<div class="b-layout"><ul class="b-menu"><li><a href="/projects/">Все</a></li>
+<li><a href="/freelancers/">Фрилансеры</a></li></ul></div>
+<!-- баннер --><div class="b-banner">Реклама &copy; 2020</div>
+<div id="projects-list" class="b-page__lenta">
+{posts}</div>
+<div class="b-pager"><ul class="b-pager__list"><li><a href="?page=2">2</a></li>
+</ul></div>
+<div class="b-footer"><p>&copy; FL.ru</p></div>
+</body></html>'''
+
+
+FL_UA_ITEM = '''\
+<li class="j-order {extra}">
+  <header class="l-project-title">{pin}<a \
+href="https://freelance.ua/orders/{n}-zakaz-{n}.html">Заказ  &laquo;{n}&raquo;
+  </a><span class="l-project-views">5</span></header>
+  <div class="l-project-head"><span class="l-price">{n}&nbsp;грн</span>
+    <span class="l-date">сегодня</span></div>
+  <article><p>Описание
+     заказа {n} &amp; &quot;детали&quot;<br>вторая   строка</p>
+    <ul class="l-tags"><li>php</li><li>css</li></ul></article>
+</li>
+'''
+
+
+def fl_ua_page(ids: list, pinned=()) -> str:
+    items = ''.join(FL_UA_ITEM.format(
+        n=n, extra='l-fixed' if n in pinned else '',
+        pin='<i class="c-icon-fixed"></i>' if n in pinned else '')
+        for n in ids)
+    return f'''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Заказы</title></head><body>
+<ul class="l-left-categories l-inside visible-md visible-lg">
+<li data-id="1"><span class="j-cat-title">Веб</span><ul><li><span \
+class="j-spec" data-cat="1" data-id="3" data-keyword="web">Сайты</span>\
+</li></ul></li></ul>
+<div class="l-content">
+<ul class="l-projectList">
+{items}</ul>
+<div class="pagination"><ul><li class="active">1</li><li>2</li></ul></div>
+</div>
+<footer><ul><li>&copy; Freelance.ua</li></ul></footer>
+</body></html>'''
+
+
+PAGES_FL_RU = [
+    fl_ru_page(range(1050, 1000, -1), pinned={1050, 1049}),
+    fl_ru_page(range(1053, 1003, -1), pinned={1050}),
+    fl_ru_page([7]),
+    fl_ru_page([]),
+    '',
+]
+
+PAGES_FL_UA = [
+    fl_ua_page(range(550, 500, -1), pinned={550}),
+    fl_ua_page(range(553, 503, -1), pinned={550}),
+    fl_ua_page([7]),
+    fl_ua_page([]),
+    '',
+]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('html', PAGES_FL_RU)
+def test_fl_ru_matches_baseline(html, backend):
+    expected = baseline_parse_fl_ru(html)
+    assert fl_parser.parse_jobs_fl_ru(html, backend) == expected
+    assert list(fl_parser.iter_jobs_fl_ru(html, backend)) == expected
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('html', PAGES_FL_UA)
+def test_fl_ua_matches_baseline(html, backend):
+    expected = baseline_parse_fl_ua(html)
+    assert fl_parser.parse_jobs_fl_ua(html, backend) == expected
+    assert list(fl_parser.iter_jobs_fl_ua(html, backend)) == expected
+
+
+def test_fixtures_cover_all_fields():
+    jobs = baseline_parse_fl_ru(PAGES_FL_RU[0])
+    assert len(jobs) == 50
+    assert jobs[0]['pinned'] and 'pinned' not in jobs[2]
+    assert jobs[0]['title'] == 'Проект «1050» & Co'
+    assert jobs[0]['price'] == '105000\xa0₽'
+    assert jobs[0]['description'] == 'Нужен "сайт" для 1050 <клиентов>'
+
+    jobs = baseline_parse_fl_ua(PAGES_FL_UA[0])
+    assert len(jobs) == 50
+    assert jobs[0]['pinned'] and 'pinned' not in jobs[1]
+    assert jobs[0]['title'] == 'Заказ  «550»'
+    assert jobs[0]['description'] == ('Описание заказа 550 & "детали"вторая '
+                                      'строка')
+
+
+@pytest.mark.parametrize('iter_func, parse_func, pages', [
+    (fl_parser.iter_jobs_fl_ru, fl_parser.parse_jobs_fl_ru, PAGES_FL_RU),
+    (fl_parser.iter_jobs_fl_ua, fl_parser.parse_jobs_fl_ua, PAGES_FL_UA),
+])
+def test_known_jobs_are_reused(iter_func, parse_func, pages):
+    old_jobs = parse_func(pages[0])
+    known_jobs = {fl_parser.get_job_key(job['url']): job for job in old_jobs
+                  if not job.get('pinned')}
+
+    assert list(iter_func(pages[1], known_jobs=known_jobs)) == \
+        parse_func(pages[1])
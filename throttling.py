@@ -0,0 +1,83 @@
+"""Модуль ограничения частоты http-запросов к сайтам бирж фриланса (во
+избежание 'бана'). Реализует алгоритм "ведро токенов" (token bucket) со
+случайной добавкой к времени ожидания и накоплением статистики ожиданий.
+"""
+import asyncio
+import threading
+import time
+from random import uniform
+
+class TokenBucket:
+    """Ограничитель частоты запросов к одному сайту.
+
+    rate: float - средняя допустимая частота запросов (запросов в секунду);
+    burst: int - максимальное число запросов, выполняемых подряд без ожидания;
+    jitter: float - максимальная случайная добавка к времени ожидания
+    (секунды); добавляется только тогда, когда ожидание действительно нужно.
+    """
+    def __init__(self, rate: float, burst: int=1, jitter: float=0):
+        self.rate = rate
+        self.burst = burst
+        self.jitter = jitter
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+        # Статистика ожиданий
+        self.requests = 0
+        self.delayed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    # Зарезервировать токен и вычислить время ожидания до запроса (секунды).
+    # Количество токенов может стать отрицательным: это означает очередь
+    # уже зарезервированных запросов
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(self.burst),
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+
+            if self._tokens >= 0:
+                wait = 0.0
+            else:
+                wait = -self._tokens / self.rate + uniform(0, self.jitter)
+
+            self.requests += 1
+            if wait > 0:
+                self.delayed += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+
+        return wait
+
+    # Дождаться разрешения на выполнение запроса, не блокируя цикл событий
+    async def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    # Блокирующая версия acquire()
+    def acquire_sync(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    # Получить статистику ожиданий
+    def get_stats(self) -> dict:
+        """Возвращаемое значение:
+        dict('requests': int - общее число запросов;
+             'delayed': int - число запросов, которым пришлось ждать;
+             'wait_total': float - суммарное время ожидания (секунды);
+             'wait_max': float - максимальное время ожидания (секунды))
+        """
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'delayed': self.delayed,
+                'wait_total': self.wait_total,
+                'wait_max': self.wait_max,
+            }